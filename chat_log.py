@@ -0,0 +1,70 @@
+# ============================================================================
+# FILE: chat_log.py
+# ============================================================================
+
+from db import get_chat_log_collection, run_read
+from models import ChatTurn
+from datetime import datetime, timezone
+import time
+
+
+def append_turns(user_id, turns):
+    """Append chat turns (ChatTurn or (role, message) pairs) in one round-trip
+
+    Returns the turns' timestamps, which double as paging cursors.
+    """
+    if not turns:
+        return []
+
+    chat_log_collection = get_chat_log_collection()
+    now = time.time()
+    docs = [
+        {
+            "user_id": user_id,
+            **ChatTurn(role, message).to_doc(),
+            # Strictly increasing within a batch, used as the paging cursor
+            "ts": now + i * 1e-6,
+            "metadata": {"created": datetime.now(timezone.utc)},
+        }
+        for i, (role, message) in enumerate(turns)
+    ]
+    chat_log_collection.insert_many(docs)
+    return [doc["ts"] for doc in docs]
+
+
+def get_turns(user_id, limit=20, before=None):
+    """Load the `limit` most recent turns older than the `before` cursor
+
+    Returns:
+        (turns, stamps): ChatTurns oldest first and their
+        timestamps; pass stamps[0] as `before` to load the next older page
+    """
+    chat_log_collection = get_chat_log_collection()
+    query = {"user_id": user_id}
+    if before is not None:
+        query["ts"] = {"$lt": before}
+
+    docs = run_read(lambda: list(chat_log_collection.find(
+        query,
+        projection={"role": True, "text": True, "ts": True},
+        sort={"ts": -1},
+        limit=limit
+    )))
+
+    docs.reverse()
+    turns = [ChatTurn.from_doc(doc) for doc in docs]
+    stamps = [doc.get("ts") for doc in docs]
+    return turns, stamps
+
+
+def clear_chat_log(user_id, before=None):
+    """Delete a user's turns logged at or before `before` (all by default)
+
+    Pass the time the user asked to clear, so turns logged after that (an
+    answer still in flight) survive. Returns the number of turns deleted.
+    """
+    chat_log_collection = get_chat_log_collection()
+    query = {"user_id": user_id}
+    if before is not None:
+        query["ts"] = {"$lte": before}
+    return chat_log_collection.delete_many(query).deleted_count
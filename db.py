@@ -4,12 +4,15 @@
 
 from astrapy import DataAPIClient
 from dotenv import load_dotenv
+from resilience import resilient_call
 import os
 
 load_dotenv()
 
 ENDPOINT = os.getenv("ASTRA_ENDPOINT")
 TOKEN = os.getenv("ASTRA_DB_APPLICATION_TOKEN")
+READ_TIMEOUT = float(os.getenv("ASTRA_READ_TIMEOUT", "10"))
+READ_RETRIES = int(os.getenv("ASTRA_READ_RETRIES", "2"))
 
 _client = None
 _db = None
@@ -43,3 +46,30 @@ def get_personal_data_collection():
 
 def get_notes_collection():
     return get_collection("notes")
+
+
+def get_chat_log_collection():
+    return get_collection("chat_log")
+
+
+def get_food_log_collection():
+    return get_collection("food_log")
+
+
+def get_food_rollups_collection():
+    return get_collection("food_rollups")
+
+
+def run_read(fn, deadline=None, fallback=None):
+    """Run an idempotent Astra read with timeout, jittered retries and a breaker
+
+    fn must fully materialize its result (e.g. wrap cursors in list()).
+    """
+    return resilient_call(
+        "astra",
+        fn,
+        deadline=deadline,
+        timeout=READ_TIMEOUT,
+        retries=READ_RETRIES,
+        fallback=fallback
+    )
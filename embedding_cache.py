@@ -0,0 +1,131 @@
+# ============================================================================
+# FILE: embedding_cache.py
+# ============================================================================
+
+from array import array
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".embedding_cache.sqlite")
+MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_ENTRIES", "5000"))
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Case- and whitespace-insensitive form of a note used for cache keys"""
+    return _SPACE_RE.sub(" ", text).strip().lower().rstrip(".!")
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: in-memory LRU over a local SQLite table
+
+    Vectors are stored as packed float32 arrays keyed by normalized-text hash,
+    in both tiers: array("f") takes 4 bytes a dimension where a list of
+    floats takes about 32. Callers convert to a list where one is needed.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, memory_entries: int = MEMORY_ENTRIES):
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stored": 0}
+
+    def get_many(self, keys) -> dict:
+        """Return {key: array("f") vector} for every key found in either tier"""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in dict.fromkeys(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self._stats["memory_hits"] += 1
+                else:
+                    missing.append(key)
+
+            rows = []
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(missing) if self._db is not None else 0, 500):
+                chunk = missing[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows += self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector
+                self._remember(key, vector)
+                self._stats["disk_hits"] += 1
+
+            self._stats["misses"] += len(missing) - sum(1 for key in missing if key in found)
+        return found
+
+    def put_many(self, items: dict):
+        """Store {key: vector} (any sequence of floats) in both tiers"""
+        if not items:
+            return
+        items = {key: array("f", vector) for key, vector in items.items()}
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._db is not None:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created) VALUES (?, ?, ?)",
+                    [(key, vector.tobytes(), now) for key, vector in items.items()]
+                )
+                self._db.commit()
+            self._stats["stored"] += len(items)
+
+    def _remember(self, key, vector):
+        """Add to the memory tier, evicting least recently used (lock held)"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = lookups - self._stats["misses"]
+            return {
+                **self._stats,
+                "memory_entries": len(self._memory),
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """The process-wide embedding cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
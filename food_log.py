@@ -0,0 +1,193 @@
+# ============================================================================
+# FILE: food_log.py
+# ============================================================================
+
+from db import get_food_log_collection, get_food_rollups_collection, run_read
+from models import FoodEntry, MACROS
+from datetime import datetime, timedelta, timezone
+import time
+
+
+# Rollup documents hold running totals per user and period, maintained with
+# $inc on every log/delete, so reading a day or week is one lookup no matter
+# how many entries it has. _ids: "<user_id>:day:2024-05-06", "<user_id>:week:2024-W19"
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+def _parse_day(day):
+    if day is None:
+        return _today()
+    if isinstance(day, str):
+        return datetime.strptime(day, "%Y-%m-%d").date()
+    return day
+
+
+def week_key(day) -> str:
+    year, week, _ = _parse_day(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _rollup_ids(user_id, day):
+    day = _parse_day(day)
+    return f"{user_id}:day:{day.isoformat()}", f"{user_id}:week:{week_key(day)}"
+
+
+def _apply_to_rollups(entry: FoodEntry, sign: int):
+    """Add (sign=1) or remove (sign=-1) an entry from its day and week totals"""
+    rollups_collection = get_food_rollups_collection()
+    day = _parse_day(entry.day)
+    day_id, week_id = _rollup_ids(entry.user_id, day)
+    increments = {macro: sign * getattr(entry, macro) for macro in MACROS}
+    increments["entries"] = sign
+
+    for _id, period, start in (
+        (day_id, "day", day),
+        (week_id, "week", day - timedelta(days=day.weekday())),
+    ):
+        rollups_collection.update_one(
+            {"_id": _id},
+            {
+                "$inc": increments,
+                "$setOnInsert": {
+                    "user_id": entry.user_id,
+                    "period": period,
+                    "start": start.isoformat(),
+                },
+            },
+            upsert=True
+        )
+
+
+def log_food(user_id, food, calories=0, protein=0, fat=0, carbs=0, day=None) -> FoodEntry:
+    """Record a food and fold it into the day and week rollups"""
+    entry = FoodEntry.from_doc({
+        "user_id": user_id,
+        "food": food,
+        "day": _parse_day(day).isoformat(),
+        "calories": calories,
+        "protein": protein,
+        "fat": fat,
+        "carbs": carbs,
+        "ts": time.time(),
+    })
+    result = get_food_log_collection().insert_one(entry.to_doc())
+    entry.id = result.inserted_id
+    _apply_to_rollups(entry, 1)
+    return entry
+
+
+def delete_food_entry(entry: FoodEntry) -> bool:
+    result = get_food_log_collection().delete_one({"_id": entry.id})
+    if result.deleted_count > 0:
+        _apply_to_rollups(entry, -1)
+        return True
+    return False
+
+
+def get_entries(user_id, day=None) -> list:
+    """Raw entries for one day, oldest first"""
+    food_log_collection = get_food_log_collection()
+    docs = run_read(lambda: list(food_log_collection.find(
+        {"user_id": user_id, "day": _parse_day(day).isoformat()},
+        sort={"ts": 1}
+    )))
+    return [FoodEntry.from_doc(doc) for doc in docs]
+
+
+# ============================================================================
+# SUMMARIES
+# ============================================================================
+
+def _period_summary(rollup, targets, days):
+    totals = {macro: round((rollup or {}).get(macro, 0), 1) for macro in MACROS}
+    adherence = {}
+    for macro in MACROS:
+        target = getattr(targets, macro, None) if targets is not None else None
+        adherence[macro] = totals[macro] / (target * days) if target else None
+    return {
+        "totals": totals,
+        "entries": int((rollup or {}).get("entries", 0)),
+        "days": days,
+        "adherence": adherence,
+    }
+
+
+def get_summary(user_id, nutrition=None, day=None, deadline=None) -> dict:
+    """Day and week-to-date totals and adherence to daily targets
+
+    Reads the two rollup documents in one round-trip. Adherence is the
+    fraction of the target reached (weekly targets scale with the days so
+    far in the week); None where no target is set.
+
+    Args:
+        nutrition: a Nutrition with the user's daily targets
+    """
+    rollups_collection = get_food_rollups_collection()
+    day = _parse_day(day)
+    day_id, week_id = _rollup_ids(user_id, day)
+    docs = run_read(
+        lambda: list(rollups_collection.find({"_id": {"$in": [day_id, week_id]}})),
+        deadline=deadline,
+        fallback=lambda: []
+    )
+    by_id = {doc["_id"]: doc for doc in docs}
+    return {
+        "day": {"key": day.isoformat(), **_period_summary(by_id.get(day_id), nutrition, 1)},
+        "week": {"key": week_key(day), **_period_summary(by_id.get(week_id), nutrition, day.weekday() + 1)},
+    }
+
+
+def format_summary(summary: dict) -> str:
+    """One line per period for the AI coach's context"""
+    lines = []
+    for label, period in (("Today", summary["day"]), ("This week so far", summary["week"])):
+        if not period["entries"]:
+            lines.append(f"{label}: nothing logged")
+            continue
+        parts = []
+        for macro in MACROS:
+            unit = "kcal" if macro == "calories" else "g"
+            part = f"{macro} {period['totals'][macro]:g}{unit}"
+            if period["adherence"][macro] is not None:
+                part += f" ({period['adherence'][macro]:.0%} of target)"
+            parts.append(part)
+        lines.append(f"{label} ({period['entries']} entries over {period['days']} day(s)): " + ", ".join(parts))
+    return "\n".join(lines)
+
+
+# ============================================================================
+# MAINTENANCE
+# ============================================================================
+
+def rebuild_rollups(user_id) -> int:
+    """Recompute a user's rollups from raw entries (repairs drift after
+    a failed write); returns the number of entries scanned"""
+    food_log_collection = get_food_log_collection()
+    rollups_collection = get_food_rollups_collection()
+
+    totals = {}
+    scanned = 0
+    for doc in food_log_collection.find({"user_id": user_id}):
+        entry = FoodEntry.from_doc(doc)
+        day = _parse_day(entry.day)
+        for _id, period, start in zip(
+            _rollup_ids(user_id, day),
+            ("day", "week"),
+            (day, day - timedelta(days=day.weekday())),
+        ):
+            rollup = totals.setdefault(_id, {
+                "_id": _id, "user_id": user_id, "period": period,
+                "start": start.isoformat(), "entries": 0,
+                **{macro: 0 for macro in MACROS},
+            })
+            rollup["entries"] += 1
+            for macro in MACROS:
+                rollup[macro] += getattr(entry, macro)
+        scanned += 1
+
+    rollups_collection.delete_many({"user_id": user_id})
+    if totals:
+        rollups_collection.insert_many(list(totals.values()))
+    return scanned
@@ -3,7 +3,13 @@
 # ============================================================================
 
 from db import get_personal_data_collection, get_notes_collection
+from write_behind import get_write_behind, STAMP_FIELD
+from models import GeneralInfo, Nutrition, Note, GOALS
+from embedding_cache import get_embedding_cache, text_key
+from search_index import get_search_index
+from profiles import invalidate_profile_cache, bump_notes_version
 from datetime import datetime, timezone
+import time
 
 
 def _get_collections():
@@ -13,38 +19,140 @@ def _get_collections():
     )
 
 
+_SECTIONS = {"general": GeneralInfo, "nutrition": Nutrition}
+
+
 def update_personal_info(existing, update_type, **kwargs):
     personal_data_collection, _ = _get_collections()
 
     if update_type == "goals":
-        existing["goals"] = kwargs.get("goals", [])
-        update_field = {"goals": existing["goals"]}
+        goals = list(kwargs.get("goals", []))
+        unknown = [goal for goal in goals if goal not in GOALS]
+        if unknown:
+            raise ValueError(f"Unknown goals: {', '.join(unknown)}")
+        existing.goals = goals
+        update_field = {"goals": goals}
+    elif update_type in _SECTIONS:
+        section = _SECTIONS[update_type].from_doc(kwargs)
+        setattr(existing, update_type, section)
+        update_field = {update_type: section.to_doc()}
     else:
-        existing[update_type] = kwargs
-        update_field = {update_type: existing[update_type]}
+        raise ValueError(f"Unknown profile section: {update_type}")
 
+    # Write-behind mode: merged with other pending edits and flushed in batches
+    write_behind = get_write_behind()
+    if write_behind is not None:
+        write_behind.enqueue("personal_data", existing.id, update_field)
+        return existing
+
+    # Edit times, so a late write-behind replay can't overwrite this edit
+    stamp = time.time()
     personal_data_collection.update_one(
-        {"_id": existing["_id"]},
-        {"$set": update_field}
+        {"_id": existing.id},
+        {"$set": {**update_field, **{f"{STAMP_FIELD}.{field}": stamp for field in update_field}}}
     )
+    invalidate_profile_cache(existing.id, names_changed=update_type == "general")
 
     return existing
 
 
+def flush_pending_writes():
+    """Flush buffered profile edits now (e.g. when a session ends)"""
+    write_behind = get_write_behind()
+    if write_behind is not None:
+        write_behind.flush()
+
+
 def add_note(note, profile_id):
+    return add_notes([note], profile_id)[0]
+
+
+def add_notes(notes, profile_id):
+    """Insert journal notes, reusing cached embeddings for repeated text
+
+    Notes whose normalized text was embedded before are inserted with their
+    cached `$vector`; the rest are inserted together with `$vectorize` (one
+    round-trip, embedded server-side in one batch) and their vectors are read
+    back into the cache. Duplicates within the batch are embedded only once.
+    """
     _, notes_collection = _get_collections()
+    cache = get_embedding_cache()
+
+    now = datetime.now(timezone.utc)
+    new_notes = [
+        Note(id=None, user_id=profile_id, text=note, ingested=now)
+        for note in notes
+    ]
+    keys = [text_key(note.text) for note in new_notes]
+    vectors = cache.get_many(keys)
+
+    # First occurrence of each uncached text is embedded by the server
+    to_embed = {}
+    for i, key in enumerate(keys):
+        if key not in vectors and key not in to_embed:
+            to_embed[key] = i
+
+    if to_embed:
+        docs = []
+        for i in to_embed.values():
+            doc = new_notes[i].to_doc()
+            doc["$vectorize"] = new_notes[i].text
+            docs.append(doc)
+        result = notes_collection.insert_many(docs)
+        for i, inserted_id in zip(to_embed.values(), result.inserted_ids):
+            new_notes[i].id = inserted_id
+        vectors.update(_fetch_vectors(notes_collection, to_embed, new_notes))
+        cache.put_many({key: vectors[key] for key in to_embed if key in vectors})
+
+    # Everything else reuses a cached (or just computed) vector
+    docs, pending = [], []
+    for i, (note, key) in enumerate(zip(new_notes, keys)):
+        if note.id is not None:
+            continue
+        doc = note.to_doc()
+        if key in vectors:
+            doc["$vector"] = list(vectors[key])
+        else:
+            doc["$vectorize"] = note.text
+        docs.append(doc)
+        pending.append(note)
+    if docs:
+        result = notes_collection.insert_many(docs)
+        for note, inserted_id in zip(pending, result.inserted_ids):
+            note.id = inserted_id
+
+    index = get_search_index()
+    for note in new_notes:
+        index.add(profile_id, note.id, note.text)
+    index.advance(profile_id, bump_notes_version(profile_id))
+    return new_notes
 
-    new_note = {
-        "user_id": profile_id,
-        "text": note,
-        "metadata": {"ingested": datetime.now(timezone.utc)},
-    }
 
-    result = notes_collection.insert_one(new_note)
-    new_note["_id"] = result.inserted_id
-    return new_note
+def _fetch_vectors(notes_collection, to_embed, new_notes):
+    """Read back server-computed vectors for newly inserted notes"""
+    ids = {new_notes[i].id: key for key, i in to_embed.items()}
+    try:
+        docs = notes_collection.find(
+            {"_id": {"$in": list(ids)}},
+            projection={"_id": True, "$vector": True}
+        )
+        return {
+            ids[doc["_id"]]: doc["$vector"]
+            for doc in docs
+            if doc.get("$vector") is not None
+        }
+    except Exception as e:
+        print(f"Warning: Could not read back note embeddings: {e}")
+        return {}
 
 
 def delete_note(_id):
     _, notes_collection = _get_collections()
-    return notes_collection.delete_one({"_id": _id})
+    # Returns the deleted note's owner, whose notes version changes
+    deleted = notes_collection.find_one_and_delete({"_id": _id}, projection={"user_id": True})
+    index = get_search_index()
+    index.remove(_id)
+    if deleted is not None:
+        user_id = deleted.get("user_id")
+        index.advance(user_id, bump_notes_version(user_id))
+    return deleted is not None
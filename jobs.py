@@ -0,0 +1,169 @@
+# ============================================================================
+# FILE: jobs.py
+# ============================================================================
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import os
+import threading
+import time
+import uuid
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_current = threading.local()
+
+
+class Job:
+    """A unit of background work and its pollable state"""
+
+    __slots__ = (
+        "id", "kind", "key", "status", "progress", "message",
+        "result", "error", "created_at", "finished_at", "_finished"
+    )
+
+    def __init__(self, kind: str, key: str = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            slot: getattr(self, slot)
+            for slot in self.__slots__
+            if not slot.startswith("_")
+        }
+
+
+def report_progress(progress: float, message: str = ""):
+    """Update the progress of the job running on the current worker thread"""
+    job = getattr(_current, "job", None)
+    if job is not None:
+        job.progress = max(0.0, min(1.0, progress))
+        job.message = message
+
+
+class JobQueue:
+    """Background worker pool with a submit / poll / result API
+
+    Finished jobs are kept for `result_ttl` seconds (at most `max_results`
+    of them) so polling reruns can pick up results; submitting with the
+    `key` of a queued, running or cached job returns that job instead of
+    starting a new one.
+    """
+
+    def __init__(self, max_workers: int = 4, result_ttl: float = 600.0, max_results: int = 1000):
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="job-worker"
+        )
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._by_key = {}
+
+    def submit(self, kind: str, fn, *args, key: str = None, **kwargs) -> str:
+        """Queue fn(*args, **kwargs) and return its job id"""
+        with self._lock:
+            self._evict()
+            if key is not None:
+                existing = self._jobs.get(self._by_key.get(key))
+                if existing is not None and existing.status != FAILED:
+                    return existing.id
+
+            job = Job(kind, key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._by_key[key] = job.id
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job: Job, fn, args, kwargs):
+        _current.job = job
+        job.status = RUNNING
+        try:
+            job.result = fn(*args, **kwargs)
+            job.progress = 1.0
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job._finished.set()
+            _current.job = None
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> dict:
+        """Snapshot of a job's state, or None if unknown or expired"""
+        job = self.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def wait(self, job_id: str, timeout: float = None) -> bool:
+        """Block until a job finishes or `timeout` passes; True if finished"""
+        job = self.get(job_id)
+        if job is None:
+            return True
+        return job._finished.wait(timeout)
+
+    def result(self, job_id: str, timeout: float = None):
+        """Wait up to `timeout` seconds for a job and return its result"""
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        if not job._finished.wait(timeout):
+            raise TimeoutError(f"Job {job_id} is still {job.status}")
+        if job.status == FAILED:
+            raise RuntimeError(job.error)
+        return job.result
+
+    def _evict(self):
+        """Drop expired results and the oldest ones over the cap (lock held)"""
+        now = time.time()
+        finished = [
+            job for job in self._jobs.values()
+            if job.finished_at is not None
+        ]
+        overflow = len(finished) - self.max_results
+        for job in finished:
+            if now - job.finished_at > self.result_ttl or overflow > 0:
+                overflow -= 1
+                self._jobs.pop(job.id, None)
+                if job.key is not None and self._by_key.get(job.key) == job.id:
+                    del self._by_key[job.key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+
+def create_job_queue() -> JobQueue:
+    """Job queue sized from the environment (JOB_WORKERS, JOB_RESULT_TTL)"""
+    return JobQueue(
+        max_workers=int(os.getenv("JOB_WORKERS", "4")),
+        result_ttl=float(os.getenv("JOB_RESULT_TTL", "600")),
+    )
@@ -6,15 +6,63 @@ from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_classic.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.tools import Tool
+from pydantic import BaseModel, Field, model_validator
 from langchain_community.vectorstores import AstraDB
 from dotenv import load_dotenv
+from resilience import Deadline, RateLimiter, is_rate_limited, resilient_call
+from semantic_cache import SemanticCache, conversation_context, fingerprint
+from models import Profile, Note
+from profiles import notes_version, get_profiles, get_notes_for_users
+from search_index import get_search_index, reciprocal_rank_fusion
+from shared_cache import get_shared_cache
+from food_log import get_summary, format_summary
+from nutrition_db import lookup_foods
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import deque
+from itertools import islice
+from typing import NamedTuple
 import os
+import time
 import json
 import ast
 import operator
+import hashlib
+import threading
 
 load_dotenv()
 
+# Time budgets (seconds) for Groq and Astra calls
+ASK_DEADLINE = float(os.getenv("ASK_DEADLINE_SECONDS", "60"))
+MACRO_TIMEOUT = float(os.getenv("MACRO_TIMEOUT_SECONDS", "30"))
+ROUTER_TIMEOUT = float(os.getenv("ROUTER_TIMEOUT_SECONDS", "10"))
+VECTOR_SEARCH_TIMEOUT = float(os.getenv("VECTOR_SEARCH_TIMEOUT_SECONDS", "8"))
+VECTOR_SEARCH_HEDGE_AFTER = float(os.getenv("VECTOR_SEARCH_HEDGE_SECONDS", "0.5"))
+RELEVANT_NOTES = 4  # Notes given to the model as context
+# Macro recommendations are shared by all worker processes for this long
+MACRO_CACHE_TTL = float(os.getenv("MACRO_CACHE_TTL_SECONDS", "86400"))
+
+# Semantic answer cache settings
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+ANSWER_CACHE_MIN_WORDS = 3  # Shorter questions ("why?") depend on the conversation
+
+# Per-user retrieval cache: similar questions against unchanged notes reuse
+# the notes retrieved for an earlier turn
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "1800"))
+RETRIEVAL_CACHE_THRESHOLD = float(os.getenv("RETRIEVAL_CACHE_THRESHOLD", "0.8"))
+
+# Batch questions (AskAISystem.ask_batch)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_REQUESTS_PER_MINUTE = float(os.getenv("BATCH_REQUESTS_PER_MINUTE", "30"))
+BATCH_PREFETCH = 100       # Questions whose users' data is loaded in one go
+BATCH_MAX_ATTEMPTS = 3     # Per question, retried only when rate limited
+CALLS_PER_QUESTION = 2     # Router + answer model calls
+# Breaker for batch model calls, so batch throttling or failures never
+# open the breaker interactive chat and macros go through
+BATCH_SERVICE = "groq_batch"
+
 
 # ============================================================================
 # CALCULATOR TOOL
@@ -65,10 +113,148 @@ calculator_tool = Tool(
 )
 
 
+# ============================================================================
+# NUTRITION DATABASE TOOL
+# ============================================================================
+
+# Exact per-100g macros from the bundled food table, scaled to the given weights
+nutrition_tool = Tool(
+    name="nutrition_lookup",
+    description="Look up calories, protein, fat and carbs of foods from a nutrition database. Input is one or more foods with optional weights separated by commas, like '200g chicken breast, 150g white rice, banana' (100 g when no weight is given). Counts and measures like '2 eggs' or '1 tbsp' are not converted: those items come back per 100 g, so estimate their weight in grams. Returns macros per item and the total of weighed items",
+    func=lookup_foods
+)
+
+
+# ============================================================================
+# REQUEST COALESCING
+# ============================================================================
+
+class _InFlightCall:
+    """Result slot shared by the leader and followers of one in-flight call"""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _UserSlot:
+    """Per-user concurrency cap and the number of calls holding or awaiting it"""
+
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self, limit: int):
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.users = 0
+
+
+class SingleFlight:
+    """Coalesce identical in-flight LLM calls and cap concurrent calls per user
+
+    The first caller for a key (the leader) runs the call; identical callers
+    arriving while it is running (followers) wait for the leader's result
+    instead of hitting the model provider again.
+    """
+
+    def __init__(self, per_user_limit: int = 2, slot_timeout: float = 120.0):
+        self.per_user_limit = per_user_limit
+        self.slot_timeout = slot_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._user_slots = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    @staticmethod
+    def make_key(namespace: str, inputs) -> str:
+        """Hash prompt inputs into a stable key"""
+        payload = json.dumps(inputs, sort_keys=True, default=str)
+        return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def _user_slot(self, user_id) -> _UserSlot:
+        with self._lock:
+            slot = self._user_slots.get(user_id)
+            if slot is None:
+                slot = _UserSlot(self.per_user_limit)
+                self._user_slots[user_id] = slot
+            slot.users += 1
+        return slot
+
+    def _release_user_slot(self, user_id, slot: _UserSlot):
+        """Drop a user's slot once no call holds or awaits it"""
+        with self._lock:
+            slot.users -= 1
+            if slot.users == 0:
+                self._user_slots.pop(user_id, None)
+
+    def do(self, key: str, fn, user_id=None):
+        """Run fn() once per key at a time and share its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self.stats["leaders"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            slot = self._user_slot(user_id)
+            try:
+                if not slot.semaphore.acquire(timeout=self.slot_timeout):
+                    raise RuntimeError("Too many concurrent AI requests for this user")
+                try:
+                    call.result = fn()
+                finally:
+                    slot.semaphore.release()
+            finally:
+                self._release_user_slot(user_id, slot)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+        return call.result
+
+
+# Shared by all agents so the per-user cap spans macros and chat
+request_coalescer = SingleFlight(
+    per_user_limit=int(os.getenv("LLM_PER_USER_CONCURRENCY", "2"))
+)
+
+
 # ============================================================================
 # MACRO RECOMMENDATION AGENT
 # ============================================================================
 
+class MacroTargets(BaseModel):
+    """Daily macro targets returned by the model as structured output"""
+    
+    calories: int = Field(description="Daily calories (kcal)", ge=800, le=6000)
+    protein: int = Field(description="Daily protein in grams", ge=20, le=400)
+    fat: int = Field(description="Daily fat in grams", ge=10, le=300)
+    carbs: int = Field(description="Daily carbohydrates in grams", ge=0, le=900)
+    
+    @model_validator(mode="after")
+    def check_energy(self):
+        """Macros must add up to the calories (4/4/9 kcal per gram, 15% slack)"""
+        energy = 4 * self.protein + 4 * self.carbs + 9 * self.fat
+        if abs(energy - self.calories) > 0.15 * self.calories:
+            raise ValueError(f"macros add up to {energy} kcal, not {self.calories}")
+        return self
+
+
 class MacroAgent:
     """Agent for generating macro recommendations using Groq"""
     
@@ -97,16 +283,50 @@ Ensure you do not include ```json ``` in the response, simply give me a valid js
         """)
         
         self.chain = self.prompt | self.llm
+        
+        # Schema-validated variant used for bulk recomputation
+        self.structured_prompt = ChatPromptTemplate.from_template("""
+Calculate the recommended daily intake of calories, protein (g), fat (g) and carbohydrates (g) for this user so they can achieve their goals.
+
+User Profile: {profile}
+
+Goals: {goals}
+
+Nutrition guidelines to follow: {guidelines}
+        """)
+        self.structured_chain = self.structured_prompt | self.llm.with_structured_output(MacroTargets)
     
-    def generate_macros(self, profile: dict, goals: list) -> dict:
-        """Generate macro recommendations"""
-        profile_str = self._dict_to_string(profile)
-        goals_str = ", ".join(goals)
-        
-        response = self.chain.invoke({
-            "profile": profile_str,
-            "goals": goals_str
-        })
+    def generate_macros(self, profile: dict, goals: list, user_id=None) -> dict:
+        """Generate macro recommendations
+        
+        The result has "source": "model" for the AI's targets, or "estimate"
+        for a local formula-based estimate when the model is unavailable or
+        its output could not be parsed.
+        """
+        inputs = {
+            "profile": self._dict_to_string(profile),
+            "goals": ", ".join(goals)
+        }
+        key = SingleFlight.make_key("macros", inputs)
+        cached = get_shared_cache().get(key)
+        if cached is not None:
+            return cached
+        return request_coalescer.do(
+            key,
+            lambda: self._invoke(inputs, profile, goals, key),
+            user_id=user_id
+        )
+    
+    def _invoke(self, inputs: dict, profile: dict, goals: list, cache_key: str = None) -> dict:
+        """Call the model and parse its JSON response"""
+        response = resilient_call(
+            "groq",
+            lambda: self.chain.invoke(inputs),
+            timeout=MACRO_TIMEOUT,
+            fallback=lambda: None
+        )
+        if response is None:
+            return {**self._estimate_macros(profile, goals), "source": "estimate"}
         
         # Parse JSON response
         result_text = response.content.strip()
@@ -114,15 +334,73 @@ Ensure you do not include ```json ``` in the response, simply give me a valid js
         result_text = result_text.replace("```json", "").replace("```", "").strip()
         
         try:
-            return json.loads(result_text)
-        except json.JSONDecodeError:
-            # Fallback default values if parsing fails
-            return {
-                "protein": 150,
-                "calories": 2500,
-                "fat": 70,
-                "carbs": 300
+            macros = {**json.loads(result_text), "source": "model"}
+        except (json.JSONDecodeError, TypeError):
+            # Fallback to a local estimate if parsing fails
+            return {**self._estimate_macros(profile, goals), "source": "estimate"}
+        
+        # Only model answers are shared; local estimates are retried next time
+        if cache_key:
+            get_shared_cache().put(cache_key, macros, ttl=MACRO_CACHE_TTL)
+        return macros
+    
+    def generate_macros_batch(self, items: list, guidelines: str = "",
+                              max_concurrency: int = 4) -> list:
+        """Structured macro targets for many profiles in one batched call
+        
+        Args:
+            items: (profile general dict, goals) pairs
+        
+        Returns a MacroTargets or the exception raised for each item, in
+        order; invalid model output is an error, never a default.
+        """
+        inputs = [
+            {
+                "profile": self._dict_to_string(profile),
+                "goals": ", ".join(goals) or "None",
+                "guidelines": guidelines or "Standard evidence-based sports nutrition guidelines",
             }
+            for profile, goals in items
+        ]
+        return self.structured_chain.batch(
+            inputs,
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True
+        )
+    
+    @staticmethod
+    def _estimate_macros(profile: dict, goals: list) -> dict:
+        """Local Mifflin-St Jeor estimate used when Groq is unavailable"""
+        profile = profile or {}
+        goals = goals or []
+        weight = profile.get("weight") or 75
+        height = profile.get("height") or 175
+        age = profile.get("age") or 30
+        
+        bmr = 10 * weight + 6.25 * height - 5 * age
+        bmr += 5 if profile.get("gender") == "Male" else -161
+        multipliers = {
+            "Sedentary": 1.2,
+            "Lightly Active": 1.375,
+            "Moderately Active": 1.55,
+            "Very Active": 1.725,
+            "Super Active": 1.9,
+        }
+        calories = bmr * multipliers.get(profile.get("activity_level"), 1.55)
+        if "Fat Loss" in goals:
+            calories -= 500
+        elif "Muscle Gain" in goals:
+            calories += 300
+        
+        protein = weight * (2.0 if "Muscle Gain" in goals or "Fat Loss" in goals else 1.6)
+        fat = calories * 0.25 / 9
+        carbs = max(0, (calories - protein * 4 - fat * 9) / 4)
+        return {
+            "protein": round(protein),
+            "calories": round(calories),
+            "fat": round(fat),
+            "carbs": round(carbs)
+        }
     
     @staticmethod
     def _dict_to_string(obj, level=0):
@@ -151,6 +429,17 @@ Ensure you do not include ```json ``` in the response, simply give me a valid js
 # ASK AI MULTI-AGENT SYSTEM
 # ============================================================================
 
+class BatchResult(NamedTuple):
+    """Outcome of one question answered by AskAISystem.ask_batch"""
+
+    index: int
+    user_id: int
+    question: str
+    answer: str
+    error: str
+    seconds: float
+
+
 class AskAISystem:
     """Multi-agent system with conditional routing using Groq"""
     
@@ -178,14 +467,30 @@ class AskAISystem:
         self.vectorstore = None
         self._init_vectorstore()
         
+        # Semantic cache of answers to near-identical questions
+        self.answer_cache = SemanticCache(
+            max_entries=ANSWER_CACHE_SIZE,
+            ttl=ANSWER_CACHE_TTL,
+            threshold=ANSWER_CACHE_THRESHOLD
+        )
+        
+        # Retrieved notes per (user, notes version, similar question)
+        self.retrieval_cache = SemanticCache(
+            max_entries=RETRIEVAL_CACHE_SIZE,
+            ttl=RETRIEVAL_CACHE_TTL,
+            threshold=RETRIEVAL_CACHE_THRESHOLD,
+            exact_terms=False  # Same-topic follow-ups reuse the same notes
+        )
+        self.retrieval_stats = {"vector_round_trips_saved": 0}
+        
         # Router prompt
         self.router_prompt = ChatPromptTemplate.from_template("""
 You are a decision-making assistant, and your task is to respond with either "Yes" or "No" only—nothing else.
 
 Here is the input: {question}
 
-If the user is requesting anything that involves math, respond with "Yes."
-If the user is asking a general question or making a request that does not involve math, respond with "No."
+If the user is requesting anything that involves math, or the calories or macros of specific foods, respond with "Yes."
+If the user is asking a general question or making a request that does not involve math or food macros, respond with "No."
 Your responses should be limited to "Yes" or "No" without any additional details or explanations.
         """)
         
@@ -240,101 +545,320 @@ Use the tools available to help {user_name} with their questions. Always refer t
         
         self.tool_agent = create_tool_calling_agent(
             self.math_llm,
-            [calculator_tool],
+            [calculator_tool, nutrition_tool],
             tool_prompt
         )
         
         self.tool_executor = AgentExecutor(
             agent=self.tool_agent,
-            tools=[calculator_tool],
+            tools=[calculator_tool, nutrition_tool],
             verbose=False,
             handle_parsing_errors=True,
             max_iterations=15
         )
     
-    def _route_question(self, question: str) -> bool:
+    def _route_question(self, question: str, deadline: Deadline = None, service: str = "groq") -> bool:
         """Route question to determine if it needs math tools"""
         router_chain = self.router_prompt | self.router_llm
-        response = router_chain.invoke({"question": question})
-        return "yes" in response.content.lower()
+        response = resilient_call(
+            service,
+            lambda: router_chain.invoke({"question": question}),
+            deadline=deadline,
+            timeout=ROUTER_TIMEOUT,
+            retries=1,
+            fallback=lambda: None,  # Route to the general agent
+            # Batches pace themselves on rate limits, so they must see them
+            rate_limit_fallback=service != BATCH_SERVICE
+        )
+        return response is not None and "yes" in response.content.lower()
     
-    def _get_relevant_notes(self, question: str, user_id: int) -> str:
-        """Retrieve relevant notes from vector store or database"""
-        if not self.vectorstore:
+    def _get_relevant_notes(self, question: str, user_id: int, deadline: Deadline = None) -> str:
+        """Retrieve relevant notes, reusing earlier retrievals for similar questions"""
+        try:
+            context = fingerprint("notes", user_id, notes_version(user_id))
+        except Exception as e:
+            print(f"Error reading notes version: {e}")
+            context = None
+        
+        if context is not None:
+            cached = self.retrieval_cache.lookup(question, context)
+            if cached is not None:
+                if self.vectorstore:
+                    self.retrieval_stats["vector_round_trips_saved"] += 1
+                return cached
+        
+        started = time.monotonic()
+        notes, complete = self._retrieve_notes(question, user_id, deadline)
+        # Degraded results (vector store down) are not reused
+        if context is not None and complete:
+            self.retrieval_cache.store(question, context, notes, cost=time.monotonic() - started)
+        return notes
+    
+    def _retrieve_notes(self, question: str, user_id: int, deadline: Deadline = None) -> tuple:
+        """Vector and BM25 keyword hits fused by rank
+        
+        Returns (notes, complete); complete is False when a fallback was used.
+        """
+        keyword_hits = self._keyword_search(question, user_id)
+        vector_hits = None
+        
+        if self.vectorstore:
+            def search():
+                # Search for relevant notes using vector search
+                docs = self.vectorstore.similarity_search(
+                    question,
+                    k=RELEVANT_NOTES,
+                    filter={"user_id": user_id}
+                )
+                return [doc.page_content for doc in docs]
+            
+            # Hedged to cut tail latency; None when the vector store is unavailable
+            vector_hits = resilient_call(
+                "astra_vector",
+                search,
+                deadline=deadline,
+                timeout=VECTOR_SEARCH_TIMEOUT,
+                retries=1,
+                hedge_after=VECTOR_SEARCH_HEDGE_AFTER,
+                fallback=lambda: None
+            )
+        
+        if vector_hits is None and not keyword_hits:
             # Fallback: get notes directly from database
-            return self._get_notes_from_db(user_id)
+            return self._get_notes_from_db(user_id, deadline), False
         
+        # Format notes
+        fused = reciprocal_rank_fusion([vector_hits or [], keyword_hits])
+        complete = vector_hits is not None or not self.vectorstore
+        return "\n".join(fused[:RELEVANT_NOTES]), complete
+    
+    @staticmethod
+    def _keyword_search(question: str, user_id: int) -> list:
+        """Note texts ranked by the local BM25 journal index"""
         try:
-            # Search for relevant notes using vector search
-            docs = self.vectorstore.similarity_search(
-                question,
-                k=4,
-                filter={"user_id": user_id}
-            )
-            
-            # Format notes
-            notes_text = "\n".join([doc.page_content for doc in docs])
-            return notes_text
+            hits = get_search_index().search(user_id, question, k=RELEVANT_NOTES * 2)
+            return [text for _, text, _ in hits]
         except Exception as e:
-            print(f"Error retrieving notes from vector store: {e}")
-            # Fallback: get notes directly from database
-            return self._get_notes_from_db(user_id)
+            print(f"Error searching notes index: {e}")
+            return []
     
-    def _get_notes_from_db(self, user_id: int) -> str:
+    def _get_notes_from_db(self, user_id: int, deadline: Deadline = None) -> str:
         """Get notes directly from database as fallback"""
         try:
-            from db import notes_collection
-            notes = list(notes_collection.find({"user_id": {"$eq": user_id}}))
-            # Get the most recent notes (limit to 4)
-            notes = sorted(notes, key=lambda x: x.get("metadata", {}).get("injested", ""), reverse=True)[:4]
-            notes_text = "\n".join([note.get("text", "") for note in notes])
+            from db import get_notes_collection, run_read
+            notes_collection = get_notes_collection()
+            notes = run_read(
+                lambda: list(notes_collection.find({"user_id": {"$eq": user_id}})),
+                deadline=deadline
+            )
+            # Get the most recent notes
+            notes = sorted(notes, key=lambda x: str(x.get("metadata", {}).get("ingested", "")), reverse=True)[:RELEVANT_NOTES]
+            notes_text = "\n".join([Note.from_doc(note).text for note in notes])
             return notes_text
         except Exception as e:
             print(f"Error retrieving notes from database: {e}")
             return ""
     
-    def ask(self, question: str, profile: dict, user_id: int = 1, chat_history: list = None) -> str:
+    @staticmethod
+    def _get_intake(user_id: int, profile: Profile, deadline: Deadline = None) -> str:
+        """Today's and this week's logged macros against the profile's targets"""
+        try:
+            return format_summary(get_summary(user_id, profile.nutrition, deadline=deadline))
+        except Exception as e:
+            print(f"Error reading food log summary: {e}")
+            return ""
+    
+    def ask(self, question: str, profile: Profile, user_id: int = 1, chat_history: list = None,
+            service: str = "groq") -> str:
         """Main entry point for asking questions
         
         Args:
             question: User's question
-            profile: User profile dictionary
+            profile: User profile
             user_id: User ID
-            chat_history: List of tuples in format [("human", "user message"), ("ai", "ai response"), ...]
+            chat_history: List of ChatTurn / (role, message) tuples, e.g. [("human", "user message"), ("ai", "ai response"), ...]
+            service: Circuit breaker for the model calls (BATCH_SERVICE for batches)
         """
         if chat_history is None:
             chat_history = []
         
+        key = SingleFlight.make_key("ask", {
+            "question": question,
+            "profile": profile.to_doc(),
+            "user_id": user_id,
+            "chat_history": chat_history,
+            "service": service,
+        })
+        return request_coalescer.do(
+            key,
+            lambda: self._ask(question, profile, user_id, chat_history, service),
+            user_id=user_id
+        )
+    
+    def _ask(self, question: str, profile: Profile, user_id: int, chat_history: list,
+             service: str = "groq") -> str:
+        """Answer a question (called once per set of identical in-flight requests)"""
         # Get user's name from profile, default to "there" if not set
-        user_name = profile.get("general", {}).get("name", "").strip()
+        user_name = profile.general.name.strip()
         if not user_name:
             user_name = "there"  # Fallback if name is not set
         
+        deadline = Deadline(ASK_DEADLINE)
+        
         # Get relevant notes
-        notes = self._get_relevant_notes(question, user_id)
-        profile_str = MacroAgent._dict_to_string(profile)
+        notes = self._get_relevant_notes(question, user_id, deadline)
+        profile_str = MacroAgent._dict_to_string(profile.to_doc())
         
+        # Logged intake vs targets, read from pre-aggregated rollups
+        intake = self._get_intake(user_id, profile, deadline)
+        if intake:
+            profile_str += f"\nLogged food intake:\n{intake}"
+        
+        # Answers are reused only for the same profile fields, notes and
+        # intake; follow-up questions also need the same last exchange
+        cacheable = len(question.split()) >= ANSWER_CACHE_MIN_WORDS
+        context = fingerprint(
+            profile.general.to_doc(),
+            profile.goals,
+            profile.nutrition.to_doc(),
+            notes,
+            intake,
+            conversation_context(question, chat_history)
+        )
+        if cacheable:
+            cached = self.answer_cache.lookup(question, context)
+            if cached is not None:
+                return cached
+        
+        started = time.monotonic()
+        answer = self._answer(question, profile_str, notes, chat_history, user_name, deadline, service)
+        if cacheable:
+            self.answer_cache.store(question, context, answer, cost=time.monotonic() - started)
+        return answer
+    
+    def _answer(self, question: str, profile_str: str, notes: str, chat_history: list,
+                user_name: str, deadline: Deadline, service: str = "groq") -> str:
+        """Route the question and generate an answer"""
         # Route the question
-        needs_math = self._route_question(question)
+        needs_math = self._route_question(question, deadline, service)
         
         if needs_math:
             # Use tool calling agent
-            result = self.tool_executor.invoke({
-                "input": question,
-                "profile": profile_str,
-                "notes": notes,
-                "chat_history": chat_history,
-                "user_name": user_name
-            })
+            result = resilient_call(
+                service,
+                lambda: self.tool_executor.invoke({
+                    "input": question,
+                    "profile": profile_str,
+                    "notes": notes,
+                    "chat_history": chat_history,
+                    "user_name": user_name
+                }),
+                deadline=deadline,
+                timeout=ASK_DEADLINE
+            )
             return result["output"]
         else:
             # Use general agent
             general_chain = self.general_prompt | self.general_llm
-            response = general_chain.invoke({
-                "profile": profile_str,
-                "user_question": question,
-                "notes": notes,
-                "chat_history": chat_history,
-                "user_name": user_name
-            })
+            response = resilient_call(
+                service,
+                lambda: general_chain.invoke({
+                    "profile": profile_str,
+                    "user_question": question,
+                    "notes": notes,
+                    "chat_history": chat_history,
+                    "user_name": user_name
+                }),
+                deadline=deadline,
+                timeout=ASK_DEADLINE
+            )
             return response.content
+    
+    # ------------------------------------------------------------------
+    # Batch questions
+    # ------------------------------------------------------------------
+    
+    def ask_batch(self, requests, concurrency: int = BATCH_CONCURRENCY,
+                  requests_per_minute: float = BATCH_REQUESTS_PER_MINUTE):
+        """Answer many questions, yielding BatchResults as they complete
+        
+        Args:
+            requests: Iterable of (user_id, question) pairs, consumed lazily
+            concurrency: Questions answered at the same time
+            requests_per_minute: Model call budget; halved while the provider
+                reports rate limiting, and rate-limited questions are retried
+        
+        Model calls go through their own breaker (BATCH_SERVICE), and rate
+        limits are not breaker failures, so a throttled batch neither fails
+        its questions with CircuitOpenError nor degrades interactive chat.
+        
+        Profiles and notes are loaded in bulk per chunk of BATCH_PREFETCH
+        questions. Results arrive in completion order; use `index` to match
+        them to the input.
+        """
+        # The bucket must hold a whole question's calls, even at low rates
+        limiter = RateLimiter(
+            requests_per_minute,
+            burst=max(CALLS_PER_QUESTION, int(requests_per_minute // 6))
+        )
+        requests = enumerate(requests)
+        profiles = {}
+        
+        def run(user_id, question):
+            limiter.acquire(CALLS_PER_QUESTION)
+            started = time.monotonic()
+            answer = self.ask(question, profiles[user_id], user_id, service=BATCH_SERVICE)
+            limiter.on_success()
+            return answer, time.monotonic() - started
+        
+        queue = deque()  # (index, user_id, question, attempt)
+        in_flight = {}
+        exhausted = False
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ask-batch") as executor:
+            while True:
+                if not queue and not exhausted:
+                    chunk = list(islice(requests, BATCH_PREFETCH))
+                    exhausted = not chunk
+                    self._prefetch_batch({user_id for _, (user_id, _) in chunk}, profiles)
+                    queue.extend((index, user_id, question, 1) for index, (user_id, question) in chunk)
+                
+                while queue and len(in_flight) < concurrency:
+                    item = queue.popleft()
+                    index, user_id, question, _ = item
+                    if user_id not in profiles:
+                        yield BatchResult(index, user_id, question, None, "Profile not found or could not be loaded", 0.0)
+                        continue
+                    in_flight[executor.submit(run, user_id, question)] = item
+                
+                if not in_flight:
+                    if exhausted and not queue:
+                        return
+                    continue
+                
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, user_id, question, attempt = in_flight.pop(future)
+                    try:
+                        answer, seconds = future.result()
+                        yield BatchResult(index, user_id, question, answer, None, seconds)
+                    except Exception as e:
+                        if is_rate_limited(e) and attempt < BATCH_MAX_ATTEMPTS:
+                            limiter.on_rate_limited()
+                            queue.appendleft((index, user_id, question, attempt + 1))
+                        else:
+                            yield BatchResult(index, user_id, question, None, str(e), 0.0)
+    
+    @staticmethod
+    def _prefetch_batch(user_ids, profiles: dict):
+        """Bulk-load profiles (into `profiles`) and notes for a batch chunk"""
+        missing = [user_id for user_id in user_ids if user_id not in profiles]
+        if not missing:
+            return
+        try:
+            profiles.update(get_profiles(missing))
+            index = get_search_index()
+            versions = {user_id: notes_version(user_id) for user_id in missing}
+            for user_id, notes in get_notes_for_users(missing).items():
+                index.warm(user_id, notes, versions[user_id])
+        except Exception as e:
+            print(f"Error prefetching batch data: {e}")
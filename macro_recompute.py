@@ -0,0 +1,178 @@
+# ============================================================================
+# FILE: macro_recompute.py
+# ============================================================================
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import os
+import time
+
+from db import get_personal_data_collection
+from models import GeneralInfo, Nutrition
+from profiles import invalidate_profile_cache
+from resilience import RateLimiter, is_rate_limited
+from shared_cache import get_shared_cache
+from write_behind import STAMP_FIELD
+
+
+BATCH_SIZE = int(os.getenv("MACRO_RECOMPUTE_BATCH", "25"))
+CONCURRENCY = int(os.getenv("MACRO_RECOMPUTE_CONCURRENCY", "4"))
+REQUESTS_PER_MINUTE = float(os.getenv("MACRO_RECOMPUTE_RPM", "30"))
+MAX_ATTEMPTS = 3
+
+
+def _stream_profiles(personal_data_collection):
+    """Live profiles' fields needed for macro targets, streamed page by page"""
+    cursor = personal_data_collection.find(
+        {"deleted_at": {"$exists": False}},
+        projection={"_id": True, "general": True, "goals": True}
+    )
+    for doc in cursor:
+        yield doc
+
+
+def _needs_body_data(general: GeneralInfo) -> bool:
+    return general.age is None or general.weight is None or general.height is None
+
+
+def _generate(macro_agent, limiter, items, guidelines, concurrency):
+    """Structured targets for items, retrying only the ones that failed
+
+    Returns ({index: MacroTargets}, {index: error message}, retried count).
+    """
+    results, errors = {}, {}
+    pending = list(range(len(items)))
+    retried = 0
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        for _ in pending:
+            limiter.acquire()
+        outputs = macro_agent.generate_macros_batch(
+            [items[i] for i in pending],
+            guidelines=guidelines,
+            max_concurrency=concurrency
+        )
+
+        failed = []
+        rate_limited = False
+        for i, output in zip(pending, outputs):
+            if isinstance(output, Exception):
+                errors[i] = f"{type(output).__name__}: {output}"
+                rate_limited = rate_limited or is_rate_limited(output)
+                failed.append(i)
+            else:
+                results[i] = output
+                errors.pop(i, None)
+                limiter.on_success()
+
+        if not failed or attempt == MAX_ATTEMPTS:
+            break
+        if rate_limited:
+            limiter.on_rate_limited()
+        retried += len(failed)
+        pending = failed
+    return results, errors, retried
+
+
+def recompute_macros(macro_agent, guidelines: str = "", batch_size: int = BATCH_SIZE,
+                     concurrency: int = CONCURRENCY, requests_per_minute: float = REQUESTS_PER_MINUTE,
+                     dry_run: bool = False):
+    """Regenerate `nutrition` for every profile, yielding a report per batch
+
+    Profiles are streamed from the collection and processed `batch_size` at
+    a time: one batched structured-output call (failed items retried up to
+    MAX_ATTEMPTS), then the batch's updates are written concurrently.
+    Profiles missing age, weight or height are skipped; profiles whose
+    output never validates keep their current targets and are reported.
+
+    Each report is a dict with the batch number, counts (profiles, updated,
+    skipped, failed, retried), seconds, profiles_per_second and a
+    `failures` list of (profile _id, error).
+    """
+    personal_data_collection = get_personal_data_collection()
+    limiter = RateLimiter(requests_per_minute)
+    profiles = _stream_profiles(personal_data_collection)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="macro-writes") as writer:
+        for batch_number, batch in enumerate(iter(lambda: list(islice(profiles, batch_size)), []), 1):
+            started = time.monotonic()
+            ids, items, failures = [], [], []
+            skipped = 0
+            for doc in batch:
+                try:
+                    general = GeneralInfo.from_doc(doc.get("general"))
+                except ValueError as e:
+                    failures.append((doc["_id"], f"Invalid profile: {e}"))
+                    continue
+                if _needs_body_data(general):
+                    skipped += 1
+                    continue
+                ids.append(doc["_id"])
+                items.append((general.to_doc(), list(doc.get("goals") or [])))
+
+            results, errors, retried = ({}, {}, 0)
+            if items:
+                results, errors, retried = _generate(macro_agent, limiter, items, guidelines, concurrency)
+            failures += [(ids[i], error) for i, error in sorted(errors.items())]
+
+            updates = {
+                ids[i]: Nutrition.from_doc(targets.model_dump()).to_doc()
+                for i, targets in results.items()
+            }
+            updated = 0
+            if updates and not dry_run:
+                def write(item):
+                    _id, nutrition = item
+                    personal_data_collection.update_one(
+                        {"_id": _id},
+                        {"$set": {"nutrition": nutrition, f"{STAMP_FIELD}.nutrition": time.time()}}
+                    )
+                    return _id
+
+                futures = {writer.submit(write, item): item[0] for item in updates.items()}
+                cache = get_shared_cache()
+                for future, _id in futures.items():
+                    try:
+                        future.result()
+                        updated += 1
+                        invalidate_profile_cache(_id, names_changed=False)
+                        # Version key of main.py's load_profile
+                        cache.bump(f"profile:{_id}")
+                    except Exception as e:
+                        failures.append((_id, f"Write failed: {e}"))
+
+            seconds = time.monotonic() - started
+            yield {
+                "batch": batch_number,
+                "profiles": len(batch),
+                "updated": updated if not dry_run else len(updates),
+                "skipped": skipped,
+                "failed": len(failures),
+                "retried": retried,
+                "seconds": seconds,
+                "profiles_per_second": len(batch) / seconds if seconds > 0 else 0.0,
+                "failures": failures,
+            }
+
+
+if __name__ == "__main__":
+    import argparse
+    from langchain_agents import MacroAgent
+
+    parser = argparse.ArgumentParser(description="Regenerate nutrition targets for all profiles")
+    parser.add_argument("--guidelines", default="", help="Nutrition guidelines for the model")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--dry-run", action="store_true", help="Generate and validate without writing")
+    args = parser.parse_args()
+
+    totals = {"profiles": 0, "updated": 0, "skipped": 0, "failed": 0}
+    for report in recompute_macros(MacroAgent(), args.guidelines, args.batch_size,
+                                   args.concurrency, dry_run=args.dry_run):
+        for key in totals:
+            totals[key] += report[key]
+        print(f"batch {report['batch']}: {report['profiles']} profiles, {report['updated']} updated, "
+              f"{report['skipped']} skipped, {report['failed']} failed, {report['retried']} retried, "
+              f"{report['profiles_per_second']:.1f} profiles/s")
+        for _id, error in report["failures"]:
+            print(f"  {_id}: {error}")
+    print(", ".join(f"{key} {value}" for key, value in totals.items()))
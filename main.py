@@ -3,13 +3,28 @@
 # ============================================================================
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from collections import deque
+import os
+import time
+from datetime import datetime, timezone
 from profiles import (
     create_profile, get_notes, get_profile, 
     get_profile_by_name, create_profile_by_name, get_all_user_names,
     delete_profile_by_name
 )
-from form_submit import update_personal_info, add_note, delete_note
+from form_submit import update_personal_info, add_notes, delete_note, flush_pending_writes
+from write_behind import get_write_behind
+from chat_log import append_turns, get_turns, clear_chat_log
+from models import Nutrition, ChatTurn, MACROS
+from food_log import log_food, delete_food_entry, get_entries, get_summary
+from search_index import get_search_index
+from shared_cache import get_shared_cache
+from memory_accounting import get_memory_accountant
 from langchain_agents import MacroAgent, AskAISystem
+from resilience import breaker_metrics
+from jobs import create_job_queue, DONE, FAILED
+from maintenance import purge_profile, resume_purges
 
 # Initialize agents (cached for performance)
 @st.cache_resource
@@ -19,6 +34,194 @@ def get_agents():
 
 macro_agent, ask_ai_system = get_agents()
 
+
+# Background worker pool for slow AI calls and writes (shared by all sessions)
+@st.cache_resource
+def get_job_queue():
+    """Initialize and cache the background job queue"""
+    return create_job_queue()
+
+job_queue = get_job_queue()
+
+
+def submit_purge(profile_id):
+    """Delete a tombstoned profile's data in the background (once per profile)"""
+    return job_queue.submit("purge", purge_profile, profile_id, key=f"purge:{profile_id}")
+
+
+@st.cache_resource
+def resume_maintenance():
+    """Restart profile purges interrupted by a previous process"""
+    try:
+        return resume_purges(submit_purge)
+    except Exception as e:
+        print(f"Warning: Could not resume profile purges: {e}")
+        return []
+
+resume_maintenance()
+
+# Session keys holding ids of jobs this session is waiting on
+JOB_KEYS = ["macro_job", "chat_job", "clear_chat_job", "note_job"]
+JOB_POLL_INTERVAL = 0.5
+
+# Chat turns kept in session (and sent to the AI) / loaded per "earlier" page
+CHAT_WINDOW = int(os.getenv("CHAT_WINDOW_TURNS", "20"))
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_TURNS", "20"))
+
+# Operator-only sidebar panels (cross-session memory report and tracing)
+ADMIN_PANELS = os.getenv("ADMIN_PANELS", "0") == "1"
+
+# Per-user session state, cleared on "Switch User" and profile deletion
+SESSION_KEYS = [
+    "user_name", "profile", "profile_id", "notes",
+    "chat_history", "chat_stamps", "chat_pages", "chat_question"
+] + JOB_KEYS
+
+
+def finished_job(key):
+    """Return the finished job stored under a session key (and forget it), else None"""
+    job_id = st.session_state.get(key)
+    if not job_id:
+        return None
+    status = job_queue.status(job_id)
+    if status is None:
+        # Result expired before this session polled it
+        del st.session_state[key]
+        return {"status": FAILED, "error": "Job expired, please try again", "result": None}
+    if status["status"] in (DONE, FAILED):
+        del st.session_state[key]
+        return status
+    return None
+
+
+def in_fragment_rerun():
+    """Whether the current run is a fragment-scoped rerun (not a full app run)"""
+    ctx = get_script_run_ctx()
+    return bool(ctx and getattr(ctx, "fragment_ids_this_run", None))
+
+
+def poll_job(key):
+    """Rerun the calling fragment until the job under `key` finishes
+
+    Full app runs are polled by forms() instead.
+    """
+    if key in st.session_state and in_fragment_rerun():
+        job_queue.wait(st.session_state[key], timeout=JOB_POLL_INTERVAL)
+        st.rerun(scope="fragment")
+
+
+# ============================================================================
+# CACHED DATA LOADERS (keyed by data version)
+# ============================================================================
+
+# Version counters live in the shared cache so a write in one worker
+# process invalidates the cached loads of every other worker
+# ("notes" versions are bumped by the data layer, see profiles.notes_version)
+def data_version(*key):
+    return get_shared_cache().version(":".join(map(str, key)))
+
+
+def bump_version(*key):
+    get_shared_cache().bump(":".join(map(str, key)))
+
+
+@st.cache_data(show_spinner=False)
+def load_user_names(version):
+    return get_all_user_names()
+
+
+@st.cache_data(show_spinner=False)
+def load_profile_id(name, version):
+    profile = get_profile_by_name(name)
+    return profile.id if profile else None
+
+
+@st.cache_data(show_spinner=False)
+def load_profile(profile_id, version):
+    return get_profile(profile_id)
+
+
+@st.cache_data(show_spinner=False)
+def load_notes(profile_id, version):
+    return get_notes(profile_id)
+
+
+@st.cache_data(ttl=600, max_entries=1000, show_spinner=False)
+def load_chat_page(profile_id, before):
+    return get_turns(profile_id, limit=CHAT_PAGE_SIZE, before=before)
+
+
+@st.cache_data(show_spinner=False)
+def load_food_day(profile_id, day, targets, version):
+    """Entries and rollup summary for one day (and its week)"""
+    return get_entries(profile_id, day), get_summary(profile_id, Nutrition.from_doc(targets), day)
+
+
+def load_chat_window(profile_id):
+    """Load the most recent chat turns into the bounded session buffer"""
+    turns, stamps = get_turns(profile_id, limit=CHAT_WINDOW)
+    st.session_state.chat_history = deque(turns, maxlen=CHAT_WINDOW)
+    st.session_state.chat_stamps = deque(stamps, maxlen=CHAT_WINDOW)
+    st.session_state.chat_pages = 0
+
+
+def evict_session(state):
+    """Drop an idle session's per-user data (it shows user selection again)"""
+    for key in SESSION_KEYS:
+        if key in state:
+            del state[key]
+
+
+def account_session():
+    """Report this session's large structures to the memory accountant"""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    get_memory_accountant().record(
+        ctx.session_id,
+        {
+            "profile": st.session_state.get("profile"),
+            "notes": st.session_state.get("notes"),
+            "chat_history": st.session_state.get("chat_history"),
+            "chat_stamps": st.session_state.get("chat_stamps"),
+        },
+        label=st.session_state.get("user_name", ""),
+        # ctx.session_state is a wrapper made for each script run; the
+        # SessionState inside it lives as long as the browser session
+        state=getattr(ctx.session_state, "_state", ctx.session_state),
+        evict=evict_session
+    )
+
+
+def account_fragment():
+    """Record activity on fragment reruns, which don't go through forms()"""
+    if in_fragment_rerun():
+        account_session()
+
+
+def open_profile(user_name, profile_id):
+    """Load a profile and its notes into the session"""
+    st.session_state.user_name = user_name
+    st.session_state.profile = load_profile(profile_id, data_version("profile", profile_id))
+    st.session_state.profile_id = profile_id
+    st.session_state.notes = load_notes(profile_id, data_version("notes", profile_id))
+    load_chat_window(profile_id)
+
+
+def save_profile(update_type, **kwargs):
+    """Persist a profile section and invalidate cached loads of it"""
+    profile_id = st.session_state.profile_id
+    st.session_state.profile = update_personal_info(
+        st.session_state.profile,
+        update_type,
+        **kwargs
+    )
+    # With write-behind the flush bumps these once the edit is in the database
+    if get_write_behind() is None:
+        bump_version("profile", profile_id)
+        if update_type == "general":
+            bump_version("names")
+
 # Page config
 st.set_page_config(
     page_title="Advanced Multi-Agent AI Fitness Coach App",
@@ -35,20 +238,22 @@ with col2:
     st.divider()
 
 
+@st.fragment
 def personal_data_form():
     """Form for collecting personal user data"""
+    account_fragment()
     # Compact card container that fits the screen
     with st.container(border=True):
         with st.form("personal_data", clear_on_submit=False):
             profile = st.session_state.profile
 
             # Get values
-            name_value = profile["general"].get("name", "") or ""
-            age_value = profile["general"].get("age")
-            weight_value = profile["general"].get("weight")
-            height_value = profile["general"].get("height")
-            gender_value = profile["general"].get("gender", "")
-            activity_value = profile["general"].get("activity_level", "")
+            name_value = profile.general.name or ""
+            age_value = profile.general.age
+            weight_value = profile.general.weight
+            height_value = profile.general.height
+            gender_value = profile.general.gender
+            activity_value = profile.general.activity_level
 
             # Compact header
             st.markdown("### 👤 Personal Information")
@@ -122,8 +327,7 @@ def personal_data_form():
             if personal_data_submit:
                 if all([name, age, weight, height, gender, activity_level]):
                     with st.spinner("Saving..."):
-                        st.session_state.profile = update_personal_info(
-                            profile, 
+                        save_profile(
                             "general", 
                             name=name, 
                             weight=weight, 
@@ -133,13 +337,15 @@ def personal_data_form():
                             activity_level=activity_level
                         )
                         st.session_state.personal_info_saved = True  # Set flag for next render
-                        st.rerun()
+                        st.rerun(scope="fragment")
                 else:
                     st.warning("⚠️ Please fill in all fields!")
 
 
+@st.fragment
 def goals_form():
     """Form for selecting fitness goals"""
+    account_fragment()
     profile = st.session_state.profile
     
     # Compact card container
@@ -150,7 +356,7 @@ def goals_form():
             goals = st.multiselect(
                 "Select your fitness goals",
                 ["Muscle Gain", "Fat Loss", "Stay Active"],
-                default=profile.get("goals", ["Muscle Gain"])
+                default=profile.goals
             )
 
             # Display success message if exists
@@ -163,47 +369,63 @@ def goals_form():
             if goals_submit:
                 if goals:
                     with st.spinner("Saving..."):
-                        st.session_state.profile = update_personal_info(
-                            profile, 
-                            "goals", 
-                            goals=goals
-                        )
+                        save_profile("goals", goals=goals)
                         st.session_state.goals_saved = True  # Set flag for next render
-                        st.rerun()
+                        st.rerun(scope="fragment")
                 else:
                     st.warning("⚠️ Please select at least one goal!")
 
 
+@st.fragment
 def macros():
     """Macro calculator with AI generation"""
+    account_fragment()
     profile = st.session_state.profile
     
     nutrition = st.container(border=True)
     nutrition.header("🥗 Nutrition & Macros")
     nutrition.caption("Track your daily macronutrients and calories")
     
-    if nutrition.button("🤖 Generate Macros with AI", type="primary", use_container_width=True):
-        with st.spinner("🧠 AI is calculating your personalized macros..."):
+    if nutrition.button("🤖 Generate Macros with AI", type="primary", use_container_width=True,
+                        disabled="macro_job" in st.session_state):
+        st.session_state.macro_job = job_queue.submit(
+            "macros",
+            macro_agent.generate_macros,
+            profile.general.to_doc(),
+            profile.goals,
+            # No job key: model answers are cached by the agent, estimates
+            # should be retried on the next click
+            user_id=st.session_state.profile_id
+        )
+    
+    job = finished_job("macro_job")
+    if job is not None:
+        if job["status"] == DONE:
             try:
-                result = macro_agent.generate_macros(
-                    profile.get("general"), 
-                    profile.get("goals")
-                )
-                profile["nutrition"] = result
+                profile.nutrition = Nutrition.from_doc(job["result"])
                 st.session_state.profile = profile
-                nutrition.success("✅ AI has generated your personalized macros!")
-                st.balloons()  # Celebration animation
-            except Exception as e:
+                if job["result"].get("source") == "estimate":
+                    nutrition.warning("⚠️ The AI is unavailable right now, so these macros were "
+                                      "estimated locally from your profile. Try again later for "
+                                      "personalized targets.")
+                else:
+                    nutrition.success("✅ AI has generated your personalized macros!")
+                    st.balloons()  # Celebration animation
+            except ValueError as e:
                 nutrition.error(f"❌ Error: {str(e)}")
+        else:
+            nutrition.error(f"❌ Error: {job['error']}")
+    elif "macro_job" in st.session_state:
+        nutrition.info("🧠 AI is calculating your personalized macros...")
 
     with nutrition.form("nutrition_form", border=False):
         col1, col2, col3, col4 = st.columns(4)
         
         # Get values - use None for placeholders
-        calories_value = profile["nutrition"].get("calories")
-        protein_value = profile["nutrition"].get("protein")
-        fat_value = profile["nutrition"].get("fat")
-        carbs_value = profile["nutrition"].get("carbs")
+        calories_value = profile.nutrition.calories
+        protein_value = profile.nutrition.protein
+        fat_value = profile.nutrition.fat
+        carbs_value = profile.nutrition.carbs
         
         with col1:
             calories = st.number_input(
@@ -249,8 +471,7 @@ def macros():
 
         if st.form_submit_button("💾 Save Macros", type="primary"):
             with st.spinner("Saving..."):
-                st.session_state.profile = update_personal_info(
-                    profile, 
+                save_profile(
                     "nutrition", 
                     protein=protein, 
                     calories=calories,
@@ -258,26 +479,113 @@ def macros():
                     carbs=carbs
                 )
                 st.session_state.macros_saved = True  # Set flag for next render
-                st.rerun()
+                st.rerun(scope="fragment")
+    
+    poll_job("macro_job")
 
 
+@st.fragment
+def food_log():
+    """Daily food log with intake against macro targets"""
+    account_fragment()
+    profile_id = st.session_state.profile_id
+    targets = st.session_state.profile.nutrition
+    day = datetime.now(timezone.utc).date().isoformat()
+    
+    with st.container(border=True):
+        st.markdown("### 🍽️ Food Log")
+        st.caption("Log what you eat - progress against your targets updates instantly")
+        
+        entries, summary = load_food_day(profile_id, day, targets.to_doc(), data_version("food", profile_id))
+        
+        today, week = summary["day"], summary["week"]
+        cols = st.columns(4)
+        for col, macro in zip(cols, MACROS):
+            unit = "kcal" if macro == "calories" else "g"
+            target = getattr(targets, macro)
+            with col:
+                st.metric(
+                    macro.capitalize(),
+                    f"{today['totals'][macro]:g} {unit}",
+                    f"{week['adherence'][macro]:.0%} of week target" if target else None,
+                    delta_color="off"
+                )
+                if target:
+                    st.progress(min(today["adherence"][macro], 1.0), text=f"of {target} {unit}")
+        
+        for entry in entries:
+            cols = st.columns([5, 1])
+            with cols[0]:
+                st.text(f"{entry.food} — {entry.calories:g} kcal · P {entry.protein:g}g · "
+                        f"F {entry.fat:g}g · C {entry.carbs:g}g")
+            with cols[1]:
+                if st.button("🗑️", key=f"food_del_{entry.id}"):
+                    delete_food_entry(entry)
+                    bump_version("food", profile_id)
+                    st.rerun(scope="fragment")
+        
+        with st.form("food_log_form", clear_on_submit=True, border=False):
+            food = st.text_input("Food", placeholder="E.g., 'Chicken breast 200g'")
+            cols = st.columns(4)
+            amounts = {}
+            for col, macro in zip(cols, MACROS):
+                with col:
+                    amounts[macro] = st.number_input(
+                        "Calories" if macro == "calories" else f"{macro.capitalize()} (g)",
+                        min_value=0.0,
+                        step=1.0
+                    )
+            
+            if st.form_submit_button("➕ Log Food", type="primary"):
+                if food.strip():
+                    try:
+                        log_food(profile_id, food, day=day, **amounts)
+                        bump_version("food", profile_id)
+                        st.rerun(scope="fragment")
+                    except ValueError as e:
+                        st.error(f"❌ Error: {str(e)}")
+                else:
+                    st.warning("⚠️ Please enter a food before logging!")
+
+
+@st.fragment
 def notes():
     """Notes management with vector search"""
+    account_fragment()
     with st.container(border=True):
         st.markdown("### 📋 Fitness Journal & Notes")
         st.caption("📝 Document your progress, workouts, and insights - AI uses these for personalized advice!")
         
         if st.session_state.notes:
             st.markdown("#### Your Notes:")
-            for i, note in enumerate(st.session_state.notes):
+            query = st.text_input(
+                "🔍 Search your journal",
+                placeholder="E.g., 'leg day' or 'protein'",
+                key="notes_search"
+            )
+            
+            shown = list(enumerate(st.session_state.notes))
+            if query.strip():
+                hits = get_search_index().search(
+                    st.session_state.profile_id,
+                    query,
+                    k=len(shown),
+                    loader=lambda: st.session_state.notes
+                )
+                positions = {note.id: i for i, note in shown}
+                shown = [(positions[note_id], st.session_state.notes[positions[note_id]])
+                         for note_id, _, _ in hits if note_id in positions]
+                st.caption(f"{len(shown)} matching note(s)")
+            
+            for i, note in shown:
                 cols = st.columns([5, 1])
                 with cols[0]:
-                    st.text(note.get("text"))
+                    st.text(note.text)
                 with cols[1]:
                     if st.button("🗑️", key=f"del_{i}"):
-                        delete_note(note.get("_id"))
+                        delete_note(note.id)
                         st.session_state.notes.pop(i)
-                        st.rerun()
+                        st.rerun(scope="fragment")
         
         st.markdown("---")
         new_note = st.text_area(
@@ -286,40 +594,98 @@ def notes():
             height=100
         )
         
-        add_note_button = st.button("➕ Add Note", type="primary", use_container_width=True)
+        one_per_line = st.checkbox("Add each line as a separate note", key="notes_per_line")
+        
+        add_note_button = st.button("➕ Add Note", type="primary", use_container_width=True,
+                                    disabled="note_job" in st.session_state)
         
         if add_note_button:
             if new_note:
-                with st.spinner("💾 Adding note..."):
-                    note = add_note(new_note, st.session_state.profile_id)
-                    st.session_state.notes.append(note)
-                    st.success("✅ Note added successfully!")
-                    st.rerun()
+                if one_per_line:
+                    texts = [line.strip() for line in new_note.splitlines() if line.strip()]
+                else:
+                    texts = [new_note]
+                st.session_state.note_job = job_queue.submit(
+                    "note",
+                    add_notes,
+                    texts,
+                    st.session_state.profile_id
+                )
             else:
                 st.warning("⚠️ Please enter a note before adding!")
+        
+        job = finished_job("note_job")
+        if job is not None:
+            if job["status"] == DONE:
+                st.session_state.notes.extend(job["result"])
+                st.success(f"✅ {len(job['result'])} note(s) added successfully!")
+                st.rerun(scope="fragment")
+            else:
+                st.error(f"❌ Error: {job['error']}")
+        elif "note_job" in st.session_state:
+            st.info("💾 Adding note...")
+        
+        poll_job("note_job")
 
 
+def ask_and_log(question, profile, profile_id, chat_history):
+    """Answer a question and persist the exchange to the chat log"""
+    answer = ask_ai_system.ask(question, profile, profile_id, chat_history=chat_history)
+    try:
+        stamps = append_turns(profile_id, [ChatTurn("human", question), ChatTurn("ai", answer)])
+    except Exception as e:
+        print(f"Error saving chat turns: {e}")
+        stamps = [time.time()] * 2
+    return answer, stamps
+
+
+def render_turns(turns):
+    """Render chat turns as chat bubbles"""
+    for role, message in turns:
+        if role == "human":
+            with st.chat_message("user"):
+                st.write(message)
+        else:  # ai
+            with st.chat_message("assistant"):
+                st.write(message)
+
+
+@st.fragment
 def ask_ai_func():
     """AI chat interface with multi-agent routing and chat history"""
+    account_fragment()
     with st.container(border=True):
         st.markdown("### 🤖 AI Fitness Coach Chat")
         st.caption("💡 Ask anything about fitness, nutrition, or workouts - Your AI coach uses your profile and notes for personalized advice!")
         
         # Initialize chat history in session state
         if "chat_history" not in st.session_state:
-            st.session_state.chat_history = []
+            load_chat_window(st.session_state.profile_id)
         
         # Display chat history
         if st.session_state.chat_history:
             st.markdown("#### 💬 Conversation History")
+            
+            # Earlier turns are paged in from the chat log, never kept in session
+            has_earlier = len(st.session_state.chat_stamps) == CHAT_WINDOW
+            if st.session_state.chat_pages:
+                earlier = []
+                before = st.session_state.chat_stamps[0]
+                for _ in range(st.session_state.chat_pages):
+                    turns, stamps = load_chat_page(st.session_state.profile_id, before)
+                    earlier = turns + earlier
+                    has_earlier = len(turns) == CHAT_PAGE_SIZE
+                    if not has_earlier:
+                        break
+                    before = stamps[0]
+                with st.expander(f"🕘 Earlier messages ({len(earlier)})", expanded=True):
+                    render_turns(earlier)
+            if has_earlier and st.button("⬆️ Load earlier messages", key="load_earlier_chat"):
+                st.session_state.chat_pages += 1
+                st.rerun(scope="fragment")
+            
             with st.container():
-                for i, (role, message) in enumerate(st.session_state.chat_history):
-                    if role == "human":
-                        with st.chat_message("user"):
-                            st.write(message)
-                    else:  # ai
-                        with st.chat_message("assistant"):
-                            st.write(message)
+                render_turns(st.session_state.chat_history)
             st.divider()
         
         user_question = st.text_area(
@@ -333,38 +699,65 @@ def ask_ai_func():
         with col1:
             ask_button = st.button("🤖 Ask AI Coach", type="primary", use_container_width=True)
         with col2:
-            if st.button("🗑️ Clear Chat History", use_container_width=True):
-                st.session_state.chat_history = []
-                st.rerun()
+            if st.button("🗑️ Clear Chat History", use_container_width=True,
+                         disabled="clear_chat_job" in st.session_state):
+                # Only turns logged up to now; an answer still in flight is kept
+                st.session_state.clear_chat_job = job_queue.submit(
+                    "chat_log", clear_chat_log, st.session_state.profile_id, before=time.time()
+                )
+                st.rerun(scope="fragment")
+        
+        job = finished_job("clear_chat_job")
+        if job is not None:
+            if job["status"] == DONE:
+                # Reload what is left (turns logged after the click)
+                load_chat_page.clear()
+                load_chat_window(st.session_state.profile_id)
+                st.rerun(scope="fragment")
+            else:
+                st.error(f"❌ Could not clear chat history: {job['error']}")
+        elif "clear_chat_job" in st.session_state:
+            st.info("🗑️ Clearing chat history...")
         
-        if ask_button:
+        if ask_button and "chat_job" not in st.session_state:
             if user_question:
-                with st.spinner("🧠 AI is thinking..."):
-                    try:
-                        # Convert chat history to LangChain format
-                        langchain_history = []
-                        for role, message in st.session_state.chat_history:
-                            langchain_history.append((role, message))
-                        
-                        # Get AI response
-                        result = ask_ai_system.ask(
-                            user_question,
-                            st.session_state.profile,
-                            st.session_state.profile_id,
-                            chat_history=langchain_history
-                        )
-                        
-                        # Add to chat history
-                        st.session_state.chat_history.append(("human", user_question))
-                        st.session_state.chat_history.append(("ai", result))
-                        
-                        # Rerun to display updated chat history
-                        st.rerun()
-                        
-                    except Exception as e:
-                        st.error(f"❌ Error: {str(e)}")
+                # ChatTurns are (role, message) tuples, LangChain's format
+                langchain_history = list(st.session_state.chat_history)
+                
+                # Get AI response in the background
+                st.session_state.chat_question = user_question
+                st.session_state.chat_job = job_queue.submit(
+                    "chat",
+                    ask_and_log,
+                    user_question,
+                    st.session_state.profile,
+                    st.session_state.profile_id,
+                    chat_history=langchain_history
+                )
             else:
                 st.warning("⚠️ Please enter a question!")
+        
+        job = finished_job("chat_job")
+        if job is not None:
+            question = st.session_state.pop("chat_question", "")
+            if job["status"] == DONE:
+                # Add to chat history (bounded, older turns stay in the chat log)
+                answer, stamps = job["result"]
+                st.session_state.chat_history.extend([ChatTurn("human", question), ChatTurn("ai", answer)])
+                st.session_state.chat_stamps.extend(stamps)
+                
+                # Rerun to display updated chat history
+                st.rerun(scope="fragment")
+            else:
+                st.error(f"❌ Error: {job['error']}")
+        elif "chat_job" in st.session_state:
+            with st.chat_message("user"):
+                st.write(st.session_state.get("chat_question", ""))
+            with st.chat_message("assistant"):
+                st.write("🧠 AI is thinking...")
+        
+        poll_job("chat_job")
+        poll_job("clear_chat_job")
 
 
 def user_selection():
@@ -378,7 +771,7 @@ def user_selection():
         st.info("💡 Enter your name to continue. If you're new, a profile will be created for you automatically.")
         
         # Get existing users
-        existing_users = get_all_user_names()
+        existing_users = load_user_names(data_version("names"))
         
         if existing_users:
             with st.container(border=True):
@@ -395,13 +788,9 @@ def user_selection():
                 )
                 
                 if selected_existing:
-                    profile = get_profile_by_name(selected_existing)
-                    if profile:
-                        st.session_state.user_name = selected_existing
-                        st.session_state.profile = profile
-                        st.session_state.profile_id = profile["_id"]
-                        st.session_state.notes = get_notes(profile["_id"])
-                        st.session_state.chat_history = []
+                    profile_id = load_profile_id(selected_existing, data_version("names"))
+                    if profile_id is not None:
+                        open_profile(selected_existing, profile_id)
                         st.rerun()
             
             # Delete profile section - separate and clearly marked
@@ -424,7 +813,10 @@ def user_selection():
                     col1, col2 = st.columns([1, 1])
                     with col1:
                         if st.button("🗑️ Confirm Delete", type="primary", use_container_width=True, key="confirm_delete_user_select"):
-                            if delete_profile_by_name(delete_profile_name):
+                            deleted_id = delete_profile_by_name(delete_profile_name)
+                            if deleted_id is not None:
+                                submit_purge(deleted_id)
+                                bump_version("names")
                                 st.success(f"✅ Profile '{delete_profile_name}' and all associated data have been deleted.")
                                 st.info("🔄 Refreshing user list...")
                                 # Clear the delete selection by rerunning (widget will reset)
@@ -458,25 +850,22 @@ def user_selection():
                 if submit:
                     if user_name and user_name.strip():
                         # Check if user already exists
-                        existing_profile = get_profile_by_name(user_name.strip())
+                        existing_profile_id = load_profile_id(user_name.strip(), data_version("names"))
                         
-                        if existing_profile:
+                        if existing_profile_id is not None:
                             # Load existing profile
-                            st.session_state.user_name = user_name.strip()
-                            st.session_state.profile = existing_profile
-                            st.session_state.profile_id = existing_profile["_id"]
-                            st.session_state.notes = get_notes(existing_profile["_id"])
-                            st.session_state.chat_history = []
+                            open_profile(user_name.strip(), existing_profile_id)
                             st.rerun()
                         else:
                             # Create new profile
                             profile_id, new_profile = create_profile_by_name(user_name.strip())
                             if profile_id and new_profile:
+                                bump_version("names")
                                 st.session_state.user_name = user_name.strip()
                                 st.session_state.profile = new_profile
                                 st.session_state.profile_id = profile_id
                                 st.session_state.notes = []
-                                st.session_state.chat_history = []
+                                load_chat_window(profile_id)
                                 st.success(f"✅ Welcome, {user_name.strip()}! Your profile has been created.")
                                 st.rerun()
                             else:
@@ -494,7 +883,10 @@ def forms():
     
     # Refresh notes if needed
     if "notes" not in st.session_state:
-        st.session_state.notes = get_notes(st.session_state.profile_id)
+        profile_id = st.session_state.profile_id
+        st.session_state.notes = load_notes(profile_id, data_version("notes", profile_id))
+    
+    account_session()
     
     # Display current user in sidebar
     st.sidebar.markdown("---")
@@ -503,8 +895,10 @@ def forms():
     st.sidebar.markdown("---")
     
     if st.sidebar.button("🔄 Switch User", use_container_width=True):
+        # End of this user's session: write out buffered profile edits
+        job_queue.submit("flush", flush_pending_writes)
         # Clear session state to show user selection again
-        for key in ["user_name", "profile", "profile_id", "notes", "chat_history"]:
+        for key in SESSION_KEYS:
             if key in st.session_state:
                 del st.session_state[key]
         st.rerun()
@@ -522,10 +916,13 @@ def forms():
         st.sidebar.caption("This action cannot be undone!")
         
         if st.sidebar.button("✅ Yes, Delete", use_container_width=True, type="primary", key="sidebar_confirm_delete"):
-            if delete_profile_by_name(st.session_state.user_name):
+            deleted_id = delete_profile_by_name(st.session_state.user_name)
+            if deleted_id is not None:
+                submit_purge(deleted_id)
+                bump_version("names")
                 st.sidebar.success("✅ Profile deleted!")
                 # Clear session state
-                for key in ["user_name", "profile", "profile_id", "notes", "chat_history", "show_delete_confirm"]:
+                for key in SESSION_KEYS + ["show_delete_confirm"]:
                     if key in st.session_state:
                         del st.session_state[key]
                 st.rerun()
@@ -536,6 +933,71 @@ def forms():
             st.session_state.show_delete_confirm = False
             st.rerun()
     
+    # Circuit breaker metrics for Groq / Astra, answer cache effectiveness
+    metrics = breaker_metrics()
+    cache_stats = ask_ai_system.answer_cache.stats()
+    with st.sidebar.expander("🩺 Service Status"):
+        for name, stats in metrics.items():
+            st.markdown(f"**{name}**: {stats['state']}")
+            st.caption(
+                f"calls {stats['calls']} · failures {stats['failures']} · "
+                f"fallbacks {stats['fallbacks']} · rejected {stats['rejected']} · "
+                f"rate limited {stats['rate_limited']}"
+            )
+        st.markdown("**answer cache**")
+        st.caption(
+            f"hit rate {cache_stats['hit_rate']:.0%} · hits {cache_stats['hits']} · "
+            f"saved {cache_stats['seconds_saved']:.1f}s · entries {cache_stats['entries']}"
+        )
+        retrieval_stats = ask_ai_system.retrieval_cache.stats()
+        st.markdown("**retrieval cache**")
+        st.caption(
+            f"hit rate {retrieval_stats['hit_rate']:.0%} · vector searches saved "
+            f"{ask_ai_system.retrieval_stats['vector_round_trips_saved']} · "
+            f"saved {retrieval_stats['seconds_saved']:.1f}s"
+        )
+        shared = get_shared_cache().stats()
+        st.markdown("**shared cache**")
+        st.caption(
+            f"hit rate {shared['hit_rate']:.0%} · memory {shared['memory_hits']} · "
+            f"shared {shared['shared_hits']} · invalidations {shared['invalidations_received']} in / "
+            f"{shared['invalidations_sent']} out"
+        )
+        write_behind = get_write_behind()
+        if write_behind is not None:
+            wb = write_behind.metrics()
+            st.markdown("**write-behind**")
+            st.caption(
+                f"pending {wb['pending_docs']}/{wb['max_pending']} · "
+                f"oldest {wb['oldest_pending_seconds']:.1f}s · coalesced {wb['coalesced']} · "
+                f"back-pressure {wb['backpressure_flushes']} · failures {wb['flush_failures']}"
+            )
+    
+    # Per-session memory, process growth and allocation hot spots. Lists
+    # other sessions and can trace the whole process: operators only
+    if ADMIN_PANELS:
+        with st.sidebar.expander("🧠 Memory"):
+            accountant = get_memory_accountant()
+            report = accountant.report(top=5)
+            mb = 1024 * 1024
+            st.caption(
+                f"RSS {report['rss'] / mb:.0f} MB ({report['rss_growth_per_min'] / mb:+.2f} MB/min) · "
+                f"sessions {report['sessions']} ({report['idle_sessions']} idle) · "
+                f"tracked {report['tracked'] / mb:.1f} MB · evicted {report['evicted']}"
+            )
+            if report["fields"]:
+                st.caption(" · ".join(f"{name} {size / 1024:.0f} KB" for name, size in report["fields"].items()))
+            for session in report["top_sessions"]:
+                st.caption(
+                    f"{session['label'] or session['session_id'][:8]}: {session['bytes'] / 1024:.0f} KB "
+                    f"({session['growth_per_min'] / 1024:+.1f} KB/min, idle {session['idle_seconds']:.0f}s)"
+                )
+            if st.button("📸 Allocation snapshot", use_container_width=True):
+                for location, size, diff, count in accountant.snapshot():
+                    st.caption(f"{location}: {size / 1024:.0f} KB ({diff / 1024:+.0f} KB, {count} blocks)")
+            if report["tracing"] and st.button("⏹️ Stop tracing", use_container_width=True):
+                accountant.stop_tracing()
+    
     # Center the main content with reduced width
     col1, col2, col3 = st.columns([0.5, 3.5, 0.5])
     
@@ -547,9 +1009,17 @@ def forms():
         st.markdown("<br>", unsafe_allow_html=True)
         macros()
         st.markdown("<br>", unsafe_allow_html=True)
+        food_log()
+        st.markdown("<br>", unsafe_allow_html=True)
         notes()
         st.markdown("<br>", unsafe_allow_html=True)
         ask_ai_func()
+    
+    # Full app runs: poll background jobs with a short sleep then rerun
+    # (fragment reruns poll their own jobs, see poll_job)
+    if any(key in st.session_state for key in JOB_KEYS):
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
 
 
 if __name__ == "__main__":
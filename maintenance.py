@@ -0,0 +1,236 @@
+# ============================================================================
+# FILE: maintenance.py
+# ============================================================================
+
+import hashlib
+import os
+
+import numpy as np
+
+from db import (
+    get_personal_data_collection, get_notes_collection, get_chat_log_collection,
+    get_food_log_collection, get_food_rollups_collection
+)
+from jobs import report_progress
+from profiles import invalidate_profile_cache
+
+
+CHUNK_SIZE = int(os.getenv("MAINTENANCE_CHUNK_SIZE", "200"))
+BLOOM_BITS = 1 << 23  # 1 MB filter, ~1% false positives at 800k names
+
+# Collections holding per-user data, keyed by a user_id field; purged in order
+USER_DATA = (
+    ("notes", get_notes_collection),
+    ("chat_log", get_chat_log_collection),
+    ("food_log", get_food_log_collection),
+    ("food_rollups", get_food_rollups_collection),
+)
+
+
+def _chunks(cursor, size):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ============================================================================
+# CASCADING DELETES
+# ============================================================================
+
+def purge_profile(profile_id, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Delete a tombstoned profile's data in chunks, then the profile itself
+
+    Resumable: each finished stage is recorded on the tombstone, and every
+    stage only deletes what is left, so a purge interrupted by a restart
+    can simply be run again (see resume_purges). Returns deleted counts.
+    """
+    personal_data_collection = get_personal_data_collection()
+    tombstone = personal_data_collection.find_one(
+        {"_id": profile_id},
+        projection={"deleted_at": True, "purge_stage": True}
+    )
+    if tombstone is None:
+        return {}
+    if tombstone.get("deleted_at") is None:
+        raise RuntimeError(f"Profile {profile_id} is not deleted, refusing to purge")
+
+    stages = [name for name, _ in USER_DATA]
+    done = stages.index(tombstone["purge_stage"]) + 1 if tombstone.get("purge_stage") in stages else 0
+    deleted = {}
+    for position, (name, get_collection) in enumerate(USER_DATA[done:], done):
+        collection = get_collection()
+        deleted[name] = 0
+        while True:
+            ids = [doc["_id"] for doc in collection.find(
+                {"user_id": profile_id},
+                projection={"_id": True},
+                limit=chunk_size
+            )]
+            if not ids:
+                break
+            collection.delete_many({"_id": {"$in": ids}})
+            deleted[name] += len(ids)
+            report_progress(position / (len(stages) + 1), f"{name}: {deleted[name]} deleted")
+        personal_data_collection.update_one({"_id": profile_id}, {"$set": {"purge_stage": name}})
+
+    personal_data_collection.delete_one({"_id": profile_id})
+    invalidate_profile_cache(profile_id)
+    return deleted
+
+
+def resume_purges(submit) -> list:
+    """Restart purges of tombstoned profiles, e.g. after a crash or deploy
+
+    `submit(profile_id)` schedules one purge (typically as a job).
+    """
+    personal_data_collection = get_personal_data_collection()
+    profile_ids = []
+    for doc in personal_data_collection.find(
+        {"deleted_at": {"$exists": True}},
+        projection={"_id": True}
+    ):
+        submit(doc["_id"])
+        profile_ids.append(doc["_id"])
+    return profile_ids
+
+
+# ============================================================================
+# ORPHAN CLEANUP
+# ============================================================================
+
+def _live_profile_ids(personal_data_collection, user_ids) -> set:
+    return {
+        doc["_id"] for doc in personal_data_collection.find(
+            {"_id": {"$in": list(user_ids)}, "deleted_at": {"$exists": False}},
+            projection={"_id": True}
+        )
+    }
+
+
+def cleanup_orphans(chunk_size: int = CHUNK_SIZE, dry_run: bool = False) -> dict:
+    """Delete per-user data whose profile no longer exists (or is tombstoned)
+
+    Streams each collection in chunks and checks the chunk's owners with
+    one query, so memory stays bounded by the chunk size. Returns
+    {collection: {"scanned": n, "orphaned": m}}.
+    """
+    personal_data_collection = get_personal_data_collection()
+    report = {}
+    for position, (name, get_collection) in enumerate(USER_DATA):
+        collection = get_collection()
+        scanned = orphaned = 0
+        cursor = collection.find({}, projection={"_id": True, "user_id": True})
+        for chunk in _chunks(cursor, chunk_size):
+            live = _live_profile_ids(personal_data_collection, {doc.get("user_id") for doc in chunk})
+            orphans = [doc["_id"] for doc in chunk if doc.get("user_id") not in live]
+            if orphans and not dry_run:
+                collection.delete_many({"_id": {"$in": orphans}})
+            scanned += len(chunk)
+            orphaned += len(orphans)
+            report_progress(position / len(USER_DATA), f"{name}: {scanned} scanned, {orphaned} orphaned")
+        report[name] = {"scanned": scanned, "orphaned": orphaned}
+    return report
+
+
+# ============================================================================
+# DUPLICATE NAMES
+# ============================================================================
+
+class _BloomFilter:
+    """Fixed-size set membership test with false positives, no false negatives"""
+
+    HASHES = 4
+
+    def __init__(self, bits: int = BLOOM_BITS):
+        self.bits = bits
+        self._array = np.zeros(bits // 8 + 1, dtype=np.uint8)
+
+    def add(self, key: str) -> bool:
+        """Add a key; True if it was (probably) already present"""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4 * self.HASHES).digest()
+        present = True
+        for i in range(self.HASHES):
+            bit = int.from_bytes(digest[4 * i:4 * i + 4], "little") % self.bits
+            byte, mask = bit >> 3, 1 << (bit & 7)
+            if not self._array[byte] & mask:
+                present = False
+                self._array[byte] |= mask
+        return present
+
+
+def _normalize_name(name) -> str:
+    return " ".join((name or "").lower().split())
+
+
+def _stream_names(personal_data_collection):
+    for doc in personal_data_collection.find(
+        {"deleted_at": {"$exists": False}},
+        projection={"_id": True, "general.name": True}
+    ):
+        name = _normalize_name((doc.get("general") or {}).get("name"))
+        if name:
+            yield doc["_id"], name
+
+
+def find_duplicate_names(bloom_bits: int = BLOOM_BITS) -> list:
+    """Profiles sharing a (case/whitespace-insensitive) name
+
+    Two streaming passes: a fixed-size Bloom filter flags names seen
+    before, then only the flagged names are grouped and verified exactly.
+    Memory is the filter plus the duplicates found. Returns
+    [{"name": name, "profile_ids": [...]}], largest groups first.
+    """
+    personal_data_collection = get_personal_data_collection()
+    seen = _BloomFilter(bloom_bits)
+    candidates = set()
+    for count, (_, name) in enumerate(_stream_names(personal_data_collection), 1):
+        if seen.add(name):
+            candidates.add(name)
+        if count % 1000 == 0:
+            report_progress(0.25, f"{count} names scanned")
+
+    report_progress(0.5, f"verifying {len(candidates)} candidate names")
+    groups = {name: [] for name in candidates}
+    for _id, name in _stream_names(personal_data_collection):
+        if name in groups:
+            groups[name].append(_id)
+
+    duplicates = [
+        {"name": name, "profile_ids": ids}
+        for name, ids in groups.items()
+        if len(ids) > 1
+    ]
+    return sorted(duplicates, key=lambda group: (-len(group["profile_ids"]), group["name"]))
+
+
+if __name__ == "__main__":
+    # Cross-tenant jobs: run by operators from a shell, not from the app
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintenance jobs over all profiles")
+    commands = parser.add_subparsers(dest="command", required=True)
+    orphans = commands.add_parser("orphans", help="Delete per-user data of deleted profiles")
+    orphans.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    orphans.add_argument("--dry-run", action="store_true", help="Count orphans without deleting")
+    commands.add_parser("duplicates", help="List profiles sharing a name")
+    commands.add_parser("purge", help="Finish purging all deleted profiles")
+    args = parser.parse_args()
+
+    if args.command == "orphans":
+        for name, counts in cleanup_orphans(args.chunk_size, args.dry_run).items():
+            print(f"{name}: {counts['orphaned']} orphaned of {counts['scanned']} scanned")
+    elif args.command == "duplicates":
+        groups = find_duplicate_names()
+        for group in groups:
+            print(f"{group['name']}: profiles {', '.join(map(str, group['profile_ids']))}")
+        print(f"{len(groups)} duplicate names")
+    else:
+        def purge(profile_id):
+            print(f"{profile_id}: {purge_profile(profile_id)}")
+
+        print(f"{len(resume_purges(purge))} profiles purged")
@@ -0,0 +1,276 @@
+# ============================================================================
+# FILE: memory_accounting.py
+# ============================================================================
+
+from collections import deque
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+
+
+SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_SECONDS", "30"))
+HISTORY = 120  # samples kept per session and for the process
+# Idle sessions are evicted when above the per-session cap or while the
+# tracked total is above the total cap (least recently active first)
+SESSION_CAP = int(float(os.getenv("SESSION_MEMORY_CAP_MB", "50")) * 1024 * 1024)
+TOTAL_CAP = int(float(os.getenv("SESSION_MEMORY_TOTAL_MB", "500")) * 1024 * 1024)
+IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+ENFORCE_INTERVAL = 60.0
+TRACE_FRAMES = 10
+
+
+def deep_size(obj, seen=None) -> int:
+    """Approximate bytes reachable from obj (containers, dicts, slotted objects)"""
+    if seen is None:
+        seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        else:
+            if hasattr(item, "__dict__"):
+                stack.append(item.__dict__)
+            for cls in type(item).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    if isinstance(slot, str) and hasattr(item, slot):
+                        stack.append(getattr(item, slot))
+    return size
+
+
+def process_rss() -> int:
+    """Resident set size of this process in bytes (0 if unknown)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            # Peak, not current, outside Linux; in KB on Linux, bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+        except Exception:
+            return 0
+
+
+class _Session:
+    __slots__ = ("label", "last_seen", "sizes", "history", "state", "evict")
+
+    def __init__(self):
+        self.label = ""
+        self.last_seen = 0.0
+        self.sizes = {}
+        self.history = deque(maxlen=HISTORY)  # (time, total bytes)
+        self.state = None                     # weakref to the session's state
+        self.evict = None
+
+    @property
+    def total(self):
+        return sum(self.sizes.values())
+
+
+class MemoryAccountant:
+    """Tracks per-session memory, allocation growth and idle-session caps
+
+    Sessions report their large structures on each run via record(); sizes
+    are re-measured at most every `sample_interval` seconds. Allocation
+    tracing (tracemalloc) is off until the first snapshot() call, since it
+    slows every allocation while active.
+    """
+
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL, session_cap: int = SESSION_CAP,
+                 total_cap: int = TOTAL_CAP, idle_seconds: float = IDLE_SECONDS):
+        self.sample_interval = sample_interval
+        self.session_cap = session_cap
+        self.total_cap = total_cap
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._process_history = deque(maxlen=HISTORY)  # (time, rss, tracked bytes)
+        self._snapshots = deque(maxlen=2)
+        self._enforced = 0.0
+        self._stats = {"evicted": 0, "evicted_bytes": 0}
+
+    # ------------------------------------------------------------------
+    # Sampling
+    # ------------------------------------------------------------------
+
+    def record(self, session_id, fields: dict, label: str = "", state=None, evict=None):
+        """Note a session run and (if due) measure its fields
+
+        Args:
+            fields: name -> object, e.g. {"notes": [...], "chat_history": deque}
+            state: the session's state object, held weakly; it must live as long
+                as the session, since a dead reference means the session closed
+            evict: callable(state) that drops the session's large fields
+        """
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session()
+            session.label = label
+            session.last_seen = now
+            session.evict = evict
+            if state is not None and (session.state is None or session.state() is not state):
+                try:
+                    session.state = weakref.ref(state)
+                except TypeError:
+                    session.state = None
+            due = not session.history or now - session.history[-1][0] >= self.sample_interval
+
+        if due:
+            sizes = {name: deep_size(value) for name, value in fields.items() if value is not None}
+            with self._lock:
+                session.sizes = sizes
+                session.history.append((now, session.total))
+                self._process_history.append((now, process_rss(), self._tracked_total()))
+
+        if now - self._enforced >= ENFORCE_INTERVAL:
+            self._enforced = now
+            self.enforce()
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _tracked_total(self):
+        return sum(session.total for session in self._sessions.values())
+
+    # ------------------------------------------------------------------
+    # Caps
+    # ------------------------------------------------------------------
+
+    def enforce(self) -> list:
+        """Evict idle sessions over the caps; returns the evicted session ids"""
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if session.state is not None and session.state() is None:
+                    del self._sessions[session_id]  # Session already closed
+
+            idle = sorted(
+                (s for s in self._sessions.items() if now - s[1].last_seen >= self.idle_seconds),
+                key=lambda s: s[1].last_seen
+            )
+            total = self._tracked_total()
+            for session_id, session in idle:
+                if session.total <= self.session_cap and total <= self.total_cap:
+                    continue
+                state = session.state() if session.state is not None else None
+                if state is None or session.evict is None:
+                    continue
+                try:
+                    session.evict(state)
+                except Exception as e:
+                    print(f"Error evicting session {session_id}: {e}")
+                    continue
+                total -= session.total
+                self._stats["evicted"] += 1
+                self._stats["evicted_bytes"] += session.total
+                evicted.append(session_id)
+                del self._sessions[session_id]
+        return evicted
+
+    # ------------------------------------------------------------------
+    # Allocation tracing
+    # ------------------------------------------------------------------
+
+    def snapshot(self, limit: int = 10) -> list:
+        """Take a tracemalloc snapshot and return the top allocation sites
+
+        The first call starts tracing. Later calls report growth since the
+        previous snapshot as [(location, size_bytes, size_diff_bytes, count)].
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        with self._lock:
+            previous = self._snapshots[-1] if self._snapshots else None
+            self._snapshots.append(snapshot)
+
+        if previous is None:
+            stats = snapshot.statistics("lineno")
+            return [(str(s.traceback[0]), s.size, s.size, s.count) for s in stats[:limit]]
+        stats = snapshot.compare_to(previous, "lineno")
+        return [(str(s.traceback[0]), s.size, s.size_diff, s.count) for s in stats[:limit]]
+
+    def stop_tracing(self):
+        with self._lock:
+            self._snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _growth(history) -> float:
+        """Bytes per minute between the oldest and newest sample"""
+        if len(history) < 2:
+            return 0.0
+        (start, first), (end, last) = history[0][:2], history[-1][:2]
+        return (last - first) / (end - start) * 60 if end > start else 0.0
+
+    def report(self, top: int = 10) -> dict:
+        now = time.time()
+        with self._lock:
+            sessions = sorted(self._sessions.items(), key=lambda s: s[1].total, reverse=True)
+            fields = {}
+            for _, session in sessions:
+                for name, size in session.sizes.items():
+                    fields[name] = fields.get(name, 0) + size
+            process = list(self._process_history)
+            return {
+                "rss": process_rss(),
+                "rss_growth_per_min": self._growth([(t, rss) for t, rss, _ in process]),
+                "tracked": sum(session.total for _, session in sessions),
+                "tracked_growth_per_min": self._growth([(t, tracked) for t, _, tracked in process]),
+                "sessions": len(sessions),
+                "idle_sessions": sum(1 for _, s in sessions if now - s.last_seen >= self.idle_seconds),
+                "fields": dict(sorted(fields.items(), key=lambda f: f[1], reverse=True)),
+                "top_sessions": [
+                    {
+                        "session_id": session_id,
+                        "label": session.label,
+                        "bytes": session.total,
+                        "sizes": dict(session.sizes),
+                        "growth_per_min": self._growth(session.history),
+                        "idle_seconds": now - session.last_seen,
+                    }
+                    for session_id, session in sessions[:top]
+                ],
+                "tracing": tracemalloc.is_tracing(),
+                **self._stats,
+            }
+
+
+_accountant = None
+_accountant_lock = threading.Lock()
+
+
+def get_memory_accountant() -> MemoryAccountant:
+    """The process-wide memory accountant"""
+    global _accountant
+    with _accountant_lock:
+        if _accountant is None:
+            _accountant = MemoryAccountant()
+        return _accountant
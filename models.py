@@ -0,0 +1,337 @@
+# ============================================================================
+# FILE: models.py
+# ============================================================================
+
+from datetime import datetime
+from typing import NamedTuple
+
+
+GOALS = ("Muscle Gain", "Fat Loss", "Stay Active")
+GENDERS = ("Male", "Female", "Other")
+ACTIVITY_LEVELS = (
+    "Sedentary", "Lightly Active", "Moderately Active", "Very Active", "Super Active"
+)
+CHAT_ROLES = ("human", "ai")
+
+
+def _number(value, field, cast=float, minimum=0, maximum=None):
+    """Coerce an optional numeric field, rejecting out-of-range values"""
+    if value is None or value == "":
+        return None
+    try:
+        number = cast(float(value))
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number, got {value!r}")
+    if number < minimum or (maximum is not None and number > maximum):
+        raise ValueError(f"{field} out of range: {number}")
+    return number
+
+
+def _choice(value, field, choices):
+    """Validate an optional choice field (empty string when unset)"""
+    value = (value or "").strip()
+    if value and value not in choices:
+        raise ValueError(f"{field} must be one of {', '.join(choices)}, got {value!r}")
+    return value
+
+
+# ============================================================================
+# PROFILE
+# ============================================================================
+
+class GeneralInfo:
+    """Personal information section of a profile"""
+
+    __slots__ = ("name", "age", "weight", "height", "activity_level", "gender")
+
+    def __init__(self, name="", age=None, weight=None, height=None, activity_level="", gender=""):
+        self.name = name
+        self.age = age
+        self.weight = weight
+        self.height = height
+        self.activity_level = activity_level
+        self.gender = gender
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "GeneralInfo":
+        doc = doc or {}
+        return cls(
+            name=(doc.get("name") or "").strip(),
+            age=_number(doc.get("age"), "age", int, 1, 120),
+            weight=_number(doc.get("weight"), "weight", float, 0, 300),
+            height=_number(doc.get("height"), "height", float, 0, 250),
+            activity_level=_choice(doc.get("activity_level"), "activity_level", ACTIVITY_LEVELS),
+            gender=_choice(doc.get("gender"), "gender", GENDERS),
+        )
+
+    def to_doc(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __reduce__(self):
+        return self.__class__, tuple(getattr(self, slot) for slot in self.__slots__)
+
+
+class Nutrition:
+    """Daily macro targets of a profile"""
+
+    __slots__ = ("calories", "protein", "fat", "carbs")
+
+    def __init__(self, calories=None, protein=None, fat=None, carbs=None):
+        self.calories = calories
+        self.protein = protein
+        self.fat = fat
+        self.carbs = carbs
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "Nutrition":
+        doc = doc or {}
+        return cls(
+            calories=_number(doc.get("calories"), "calories", int, 0, 20000),
+            protein=_number(doc.get("protein"), "protein", int, 0, 2000),
+            fat=_number(doc.get("fat"), "fat", int, 0, 2000),
+            carbs=_number(doc.get("carbs"), "carbs", int, 0, 3000),
+        )
+
+    def to_doc(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __reduce__(self):
+        return self.__class__, tuple(getattr(self, slot) for slot in self.__slots__)
+
+
+class Profile:
+    """A user profile as stored in the personal_data collection"""
+
+    __slots__ = ("id", "general", "goals", "nutrition")
+
+    def __init__(self, id, general=None, goals=None, nutrition=None):
+        self.id = id
+        self.general = general or GeneralInfo()
+        self.goals = goals or []
+        self.nutrition = nutrition or Nutrition()
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "Profile":
+        if doc is None:
+            return None
+        goals = [goal for goal in doc.get("goals") or [] if goal in GOALS]
+        return cls(
+            id=doc["_id"],
+            general=GeneralInfo.from_doc(doc.get("general")),
+            goals=goals,
+            nutrition=Nutrition.from_doc(doc.get("nutrition")),
+        )
+
+    def to_doc(self) -> dict:
+        return {
+            "_id": self.id,
+            "general": self.general.to_doc(),
+            "goals": list(self.goals),
+            "nutrition": self.nutrition.to_doc(),
+        }
+
+    def __reduce__(self):
+        return Profile, (self.id, self.general, self.goals, self.nutrition)
+
+
+# ============================================================================
+# NOTES AND CHAT TURNS
+# ============================================================================
+
+class Note:
+    """A fitness journal entry"""
+
+    __slots__ = ("id", "user_id", "text", "ingested")
+
+    def __init__(self, id, user_id, text, ingested=None):
+        self.id = id
+        self.user_id = user_id
+        self.text = text
+        self.ingested = ingested
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "Note":
+        text = doc.get("text")
+        if not isinstance(text, str):
+            raise ValueError(f"Note {doc.get('_id')!r} has no text")
+        return cls(
+            id=doc.get("_id"),
+            user_id=doc.get("user_id"),
+            text=text,
+            ingested=(doc.get("metadata") or {}).get("ingested"),
+        )
+
+    def to_doc(self) -> dict:
+        doc = {
+            "user_id": self.user_id,
+            "text": self.text,
+            "metadata": {"ingested": self.ingested},
+        }
+        if self.id is not None:
+            doc["_id"] = self.id
+        return doc
+
+    def __reduce__(self):
+        return Note, (self.id, self.user_id, self.text, self.ingested)
+
+
+class ChatTurn(NamedTuple):
+    """One chat message; a plain 2-tuple, so LangChain accepts it as-is"""
+
+    role: str
+    text: str
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "ChatTurn":
+        role = doc.get("role")
+        if role not in CHAT_ROLES:
+            raise ValueError(f"Unknown chat role: {role!r}")
+        return cls(role, doc.get("text", ""))
+
+    def to_doc(self) -> dict:
+        return {"role": self.role, "text": self.text}
+
+
+# ============================================================================
+# FOOD LOG
+# ============================================================================
+
+MACROS = ("calories", "protein", "fat", "carbs")
+
+
+class FoodEntry:
+    """One logged food with its macros, attributed to a (UTC) day"""
+
+    __slots__ = ("id", "user_id", "food", "day", "calories", "protein", "fat", "carbs", "ts")
+
+    def __init__(self, id, user_id, food, day, calories=0, protein=0, fat=0, carbs=0, ts=None):
+        self.id = id
+        self.user_id = user_id
+        self.food = food
+        self.day = day
+        self.calories = calories
+        self.protein = protein
+        self.fat = fat
+        self.carbs = carbs
+        self.ts = ts
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "FoodEntry":
+        food = (doc.get("food") or "").strip()
+        if not food:
+            raise ValueError("food must not be empty")
+        return cls(
+            id=doc.get("_id"),
+            user_id=doc.get("user_id"),
+            food=food,
+            day=doc.get("day"),
+            calories=_number(doc.get("calories"), "calories", float, 0, 20000) or 0,
+            protein=_number(doc.get("protein"), "protein", float, 0, 2000) or 0,
+            fat=_number(doc.get("fat"), "fat", float, 0, 2000) or 0,
+            carbs=_number(doc.get("carbs"), "carbs", float, 0, 3000) or 0,
+            ts=doc.get("ts"),
+        )
+
+    def to_doc(self) -> dict:
+        doc = {slot: getattr(self, slot) for slot in self.__slots__ if slot != "id"}
+        if self.id is not None:
+            doc["_id"] = self.id
+        return doc
+
+    def __reduce__(self):
+        return FoodEntry, tuple(getattr(self, slot) for slot in self.__slots__)
+
+
+# ============================================================================
+# FOOTPRINT MEASUREMENT
+# ============================================================================
+
+def measure_footprint(notes: int = 500, turns: int = 200, rounds: int = 20) -> dict:
+    """Compare memory and serialization cost of models vs raw dicts/tuples
+
+    Builds one session's worth of data (a profile, `notes` notes and `turns`
+    chat turns) in both representations. Run with `python models.py`.
+    """
+    import pickle
+    import time
+    import tracemalloc
+
+    profile_doc = {
+        "_id": 1,
+        "general": {
+            "name": "Alex", "age": 30, "weight": 80.0, "height": 180.0,
+            "activity_level": "Moderately Active", "gender": "Male"
+        },
+        "goals": ["Muscle Gain"],
+        "nutrition": {"calories": 2800, "protein": 160, "fat": 80, "carbs": 350},
+    }
+    note_docs = [
+        {
+            "_id": f"note-{i}", "user_id": 1,
+            "text": f"Workout {i}: squats 5x5, felt strong",
+            "metadata": {"ingested": datetime(2024, 1, 1)},
+        }
+        for i in range(notes)
+    ]
+    turn_docs = [
+        {"role": CHAT_ROLES[i % 2], "text": f"Message {i} about training"}
+        for i in range(turns)
+    ]
+
+    def build_dicts():
+        return (
+            {**profile_doc, "general": dict(profile_doc["general"]),
+             "nutrition": dict(profile_doc["nutrition"])},
+            [{**doc, "metadata": dict(doc["metadata"])} for doc in note_docs],
+            [(doc["role"], doc["text"]) for doc in turn_docs],
+        )
+
+    def build_models():
+        return (
+            Profile.from_doc(profile_doc),
+            [Note.from_doc(doc) for doc in note_docs],
+            [ChatTurn.from_doc(doc) for doc in turn_docs],
+        )
+
+    def to_docs(session):
+        profile, note_list, turn_list = session
+        if isinstance(profile, Profile):
+            return profile.to_doc(), [n.to_doc() for n in note_list], [t.to_doc() for t in turn_list]
+        return profile, note_list, turn_list
+
+    results = {}
+    for label, build in (("dict", build_dicts), ("model", build_models)):
+        tracemalloc.start()
+        session = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            build()
+        build_seconds = (time.perf_counter() - started) / rounds
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            to_docs(session)
+        to_doc_seconds = (time.perf_counter() - started) / rounds
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            payload = pickle.dumps(session)
+        pickle_seconds = (time.perf_counter() - started) / rounds
+
+        results[label] = {
+            "bytes": size,
+            "pickle_bytes": len(payload),
+            "from_doc_ms": build_seconds * 1000,
+            "to_doc_ms": to_doc_seconds * 1000,
+            "pickle_ms": pickle_seconds * 1000,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    for label, stats in measure_footprint().items():
+        print(label, ", ".join(f"{key}={value:,.3f}" if isinstance(value, float) else f"{key}={value:,}"
+                                for key, value in stats.items()))
@@ -0,0 +1,219 @@
+# ============================================================================
+# FILE: nutrition_db.py
+# ============================================================================
+
+from bisect import bisect_left
+from collections import defaultdict
+import csv
+import os
+import re
+import threading
+
+import numpy as np
+
+from models import MACROS
+from search_index import stem
+
+
+FOODS_PATH = os.getenv(
+    "NUTRITION_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "foods.csv")
+)
+FUZZY_THRESHOLD = 0.45
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_QUANTITY_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(kg|g|grams?|ml|oz|ounces?)\b", re.IGNORECASE)
+# Counts and household measures ("2 eggs", "1 tbsp", "a cup of"), which
+# can't be converted to grams without per-food weights
+_MEASURE_RE = re.compile(
+    r"\b(?:(?:\d+/\d+|\d+(?:\.\d+)?|an?|one|two|three|four|five|six|half)\b(?!%)\s*)?"
+    r"(?:(?:tbsp|tablespoons?|tsp|teaspoons?|cups?|slices?|pieces?|servings?|scoops?|handfuls?)\b)?"
+    r"(?:\s+of\b)?",
+    re.IGNORECASE
+)
+# Not "and": it is part of food names ("mac and cheese")
+_ITEM_SPLIT_RE = re.compile(r"[;,\n+]")
+_GRAMS_PER_UNIT = {"kg": 1000.0, "oz": 28.35, "ounce": 28.35, "ounces": 28.35}
+
+
+def _words(text: str) -> list:
+    return _WORD_RE.findall(text.lower())
+
+
+def _stems(text: str) -> list:
+    """Words with plurals and common suffixes stripped ("eggs" -> "egg")"""
+    return [stem(word) for word in _words(text)]
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {' '.join(_words(text))} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NutritionDatabase:
+    """Bundled per-100g food macros with a prefix and fuzzy name index
+
+    Macros are held column-wise in one float32 array (rows = foods, columns =
+    calories, protein, fat, carbs). Names are indexed three ways: exact
+    stemmed name, sorted word list (words and their stems) for prefix
+    search, and character trigrams for typo-tolerant matching. Queries are
+    stemmed, so "eggs" finds "Egg (whole)".
+    """
+
+    def __init__(self, path: str = FOODS_PATH):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+
+        self.names = [row["name"] for row in rows]
+        self.macros = np.array(
+            [[float(row[macro]) for macro in MACROS] for row in rows],
+            dtype=np.float32
+        ).reshape(len(rows), len(MACROS))
+
+        self._exact = {" ".join(_stems(name)): i for i, name in enumerate(self.names)}
+        self._name_words = [set(_words(name)) for name in self.names]
+        self._word_list = sorted({
+            (key, i)
+            for i, words in enumerate(self._name_words)
+            for word in words
+            for key in (word, stem(word))
+        })
+        self._word_keys = [word for word, _ in self._word_list]
+
+        trigram_ids = defaultdict(list)
+        for i, name in enumerate(self.names):
+            for gram in _trigrams(name):
+                trigram_ids[gram].append(i)
+        self._trigrams = {gram: np.array(ids, dtype=np.int32) for gram, ids in trigram_ids.items()}
+        self._trigram_counts = np.array([len(_trigrams(name)) for name in self.names], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _prefix_ids(self, prefix: str) -> set:
+        """Foods with a word starting with `prefix`"""
+        ids = set()
+        start = bisect_left(self._word_keys, prefix)
+        for word, i in self._word_list[start:]:
+            if not word.startswith(prefix):
+                break
+            ids.add(i)
+        return ids
+
+    def search(self, query: str, limit: int = 5) -> list:
+        """Best matching foods as [(index, score)], score 1.0 for an exact name"""
+        words = _stems(query)
+        if not words:
+            return []
+        exact = self._exact.get(" ".join(words))
+        if exact is not None:
+            return [(exact, 1.0)]
+
+        # Every query word is a prefix of some word in the name
+        candidates = None
+        for word in words:
+            ids = self._prefix_ids(word)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        if candidates:
+            # Prefer names with the query's words as typed ("oats" over "oat
+            # milk"), then fewer extra words ("banana" over "banana bread")
+            typed = set(_words(query))
+            ranked = sorted(candidates, key=lambda i: (
+                len(typed - self._name_words[i]), len(self._name_words[i]), self.names[i]
+            ))
+            return [(i, 0.9) for i in ranked[:limit]]
+
+        # Typo-tolerant fallback: Dice similarity of character trigrams
+        grams = _trigrams(query)
+        shared = np.zeros(len(self.names), dtype=np.float32)
+        for gram in grams:
+            ids = self._trigrams.get(gram)
+            if ids is not None:
+                shared[ids] += 1
+        scores = 2 * shared / (len(grams) + self._trigram_counts)
+        top = np.argsort(scores)[::-1][:limit]
+        return [(int(i), float(scores[i])) for i in top if scores[i] >= FUZZY_THRESHOLD]
+
+    def macros_for(self, index: int, grams: float = 100.0) -> dict:
+        values = self.macros[index] * (grams / 100.0)
+        return {macro: round(float(value), 1) for macro, value in zip(MACROS, values)}
+
+
+def _parse_item(text: str):
+    """Split "200g chicken breast" into (food text, grams, unparsed quantity)
+
+    Weights are converted to grams. Counts and household measures ("2 eggs",
+    "2 tbsp") are returned as the unparsed quantity with grams None. Without
+    any quantity the portion is 100 g.
+    """
+    match = _QUANTITY_RE.search(text)
+    if match is not None:
+        amount, unit = float(match.group(1)), match.group(2).lower()
+        grams = amount * _GRAMS_PER_UNIT.get(unit, 1.0)
+        food = (text[:match.start()] + text[match.end():]).replace(" of ", " ").strip()
+        return food, grams, None
+
+    measures = [m for m in _MEASURE_RE.finditer(text) if m.group().strip()]
+    if measures:
+        food = _MEASURE_RE.sub(" ", text)
+        unparsed = " ".join(" ".join(m.group().split()) for m in measures)
+        return " ".join(food.split()), None, unparsed
+    return text.strip(), 100.0, None
+
+
+def _format_macros(macros: dict) -> str:
+    return (f"{macros['calories']:g} kcal, protein {macros['protein']:g} g, "
+            f"fat {macros['fat']:g} g, carbs {macros['carbs']:g} g")
+
+
+def lookup_foods(query: str) -> str:
+    """Tool entry point: macros for one or more foods with optional weights"""
+    db = get_nutrition_db()
+    items = [item for item in _ITEM_SPLIT_RE.split(query) if item.strip()]
+    if not items:
+        return "Error: no food given"
+
+    lines = []
+    total = dict.fromkeys(MACROS, 0.0)
+    found = unweighed = 0
+    for item in items:
+        food, grams, unparsed = _parse_item(item)
+        matches = db.search(food)
+        if not matches:
+            lines.append(f"{food}: not found in the nutrition database")
+            continue
+        index, score = matches[0]
+        if grams is None:
+            # Per-100g values; the model has to estimate the portion weight
+            line = (f"{db.names[index]}, per 100 g: {_format_macros(db.macros_for(index))} "
+                    f"(quantity '{unparsed}' not converted to grams, scale by the portion weight)")
+            unweighed += 1
+        else:
+            macros = db.macros_for(index, grams)
+            line = f"{db.names[index]}, {grams:g} g: {_format_macros(macros)}"
+            for macro in MACROS:
+                total[macro] += macros[macro]
+            found += 1
+        if score < 1.0 and len(matches) > 1:
+            line += f" (other matches: {', '.join(db.names[i] for i, _ in matches[1:3])})"
+        lines.append(line)
+
+    if found > 1:
+        label = "Total of weighed items" if unweighed else "Total"
+        lines.append(f"{label}: " + _format_macros({macro: round(value, 1) for macro, value in total.items()}))
+    return "\n".join(lines)
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_nutrition_db() -> NutritionDatabase:
+    """The bundled nutrition database, loaded on first use"""
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = NutritionDatabase()
+        return _db
@@ -2,7 +2,39 @@
 # FILE: profiles.py (STREAMLIT CLOUD SAFE)
 # ============================================================================
 
-from db import get_personal_data_collection, get_notes_collection
+from db import get_personal_data_collection, get_notes_collection, run_read
+from write_behind import get_write_behind
+from models import Profile, Note
+from search_index import get_search_index
+from shared_cache import get_shared_cache
+import time
+
+
+# Shared cache keys: "<collection>:<_id>" for documents (also invalidated by
+# write-behind flushes) and "<collection>:index:..." for derived lookups
+def profile_key(_id):
+    return f"personal_data:{_id}"
+
+
+NAMES_KEY = "personal_data:index:names"
+NAME_INDEX_PREFIX = "personal_data:index:"
+
+
+def notes_version(user_id) -> int:
+    """Host-wide version of a user's notes (also keys main.py's notes loader)"""
+    return get_shared_cache().version(f"notes:{user_id}")
+
+
+def bump_notes_version(user_id) -> int:
+    return get_shared_cache().bump(f"notes:{user_id}")
+
+
+def invalidate_profile_cache(_id, names_changed=True):
+    """Drop a cached profile (and name lookups) in every worker process"""
+    cache = get_shared_cache()
+    cache.invalidate(profile_key(_id))
+    if names_changed:
+        cache.invalidate_prefix(NAME_INDEX_PREFIX)
 
 
 def _get_collections():
@@ -37,21 +69,75 @@ def create_profile(_id):
     personal_data_collection, _ = _get_collections()
     profile_values = get_values(_id)
     result = personal_data_collection.insert_one(profile_values)
-    return result.inserted_id, profile_values
+    invalidate_profile_cache(_id)
+    return result.inserted_id, Profile.from_doc(profile_values)
+
+
+def _with_pending_writes(profile):
+    """Apply profile edits still waiting in the write-behind buffer"""
+    write_behind = get_write_behind()
+    if write_behind is None:
+        return profile
+    return write_behind.overlay("personal_data", profile)
+
+
+def _live(doc):
+    """None for tombstoned profiles (deleted, data purge still running)"""
+    if doc is None or doc.get("deleted_at") is not None:
+        return None
+    return doc
 
 
 def get_profile(_id):
     personal_data_collection, _ = _get_collections()
-    return personal_data_collection.find_one({"_id": _id})
+    doc = get_shared_cache().get_or_load(
+        profile_key(_id),
+        lambda: run_read(lambda: personal_data_collection.find_one({"_id": _id}))
+    )
+    return Profile.from_doc(_with_pending_writes(_live(doc)))
+
+
+def get_profiles(ids, chunk_size=100):
+    """Bulk get_profile: {_id: Profile}, one round-trip per chunk of cache misses"""
+    personal_data_collection, _ = _get_collections()
+    cache = get_shared_cache()
+    docs = {}
+    missing = []
+    for _id in dict.fromkeys(ids):
+        doc = cache.get(profile_key(_id))
+        if doc is not None:
+            docs[_id] = doc
+        else:
+            missing.append(_id)
+
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        since = cache.sequence()
+        for doc in run_read(lambda: list(personal_data_collection.find({"_id": {"$in": chunk}}))):
+            cache.put(profile_key(doc["_id"]), doc, since=since)
+            docs[doc["_id"]] = doc
+
+    return {
+        _id: Profile.from_doc(_with_pending_writes(doc))
+        for _id, doc in docs.items()
+        if _live(doc) is not None
+    }
 
 
 def get_profile_by_name(name):
     if not name or not name.strip():
         return None
     personal_data_collection, _ = _get_collections()
-    return personal_data_collection.find_one(
-        {"general.name": name.strip()}
-    )
+
+    def load_id():
+        doc = run_read(lambda: personal_data_collection.find_one(
+            {"general.name": name.strip(), "deleted_at": {"$exists": False}},
+            projection={"_id": True}
+        ))
+        return doc["_id"] if doc else None
+
+    _id = get_shared_cache().get_or_load(f"{NAME_INDEX_PREFIX}name:{name.strip()}", load_id)
+    return get_profile(_id) if _id is not None else None
 
 
 def create_profile_by_name(name):
@@ -60,50 +146,85 @@ def create_profile_by_name(name):
 
     personal_data_collection, _ = _get_collections()
 
-    all_profiles = list(personal_data_collection.find({}))
+    all_profiles = run_read(lambda: list(personal_data_collection.find({})))
     next_id = max([p.get("_id", 0) for p in all_profiles] + [0]) + 1
 
     profile_values = get_values(next_id)
     profile_values["general"]["name"] = name.strip()
 
     result = personal_data_collection.insert_one(profile_values)
-    return result.inserted_id, profile_values
+    invalidate_profile_cache(next_id)
+    return result.inserted_id, Profile.from_doc(profile_values)
 
 
 def get_all_user_names():
     personal_data_collection, _ = _get_collections()
-    profiles = list(personal_data_collection.find({}))
 
-    names = []
-    for profile in profiles:
-        name = profile.get("general", {}).get("name", "").strip()
-        if name:
-            names.append(name)
+    def load():
+        profiles = run_read(lambda: list(personal_data_collection.find({})))
+
+        names = []
+        for profile in profiles:
+            if _live(profile) is None:
+                continue
+            name = profile.get("general", {}).get("name", "").strip()
+            if name:
+                names.append(name)
 
-    return sorted(set(names))
+        return sorted(set(names))
+
+    return get_shared_cache().get_or_load(NAMES_KEY, load)
 
 
 def get_notes(_id):
     _, notes_collection = _get_collections()
-    return list(notes_collection.find({"user_id": _id}))
+    docs = run_read(lambda: list(notes_collection.find({"user_id": _id})))
+    return [Note.from_doc(doc) for doc in docs]
+
+
+def get_notes_for_users(ids, chunk_size=100):
+    """Bulk get_notes: {user_id: [Note]} for every requested user"""
+    _, notes_collection = _get_collections()
+    ids = list(dict.fromkeys(ids))
+    notes = {_id: [] for _id in ids}
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        for doc in run_read(lambda: list(notes_collection.find({"user_id": {"$in": chunk}}))):
+            notes[doc["user_id"]].append(Note.from_doc(doc))
+    return notes
 
 
 def delete_profile(profile_id):
-    personal_data_collection, notes_collection = _get_collections()
+    """Tombstone a profile so every read ignores it from now on
+
+    Its notes, chat log and food log are removed afterwards by
+    maintenance.purge_profile (run it as a background job).
+    """
+    personal_data_collection, _ = _get_collections()
+    write_behind = get_write_behind()
+    if write_behind is not None:
+        write_behind.discard("personal_data", profile_id)
     try:
-        notes_collection.delete_many({"user_id": profile_id})
-        result = personal_data_collection.delete_one({"_id": profile_id})
-        return result.deleted_count > 0
+        doc = personal_data_collection.find_one_and_update(
+            {"_id": profile_id, "deleted_at": {"$exists": False}},
+            {"$set": {"deleted_at": time.time()}},
+            projection={"_id": True}
+        )
+        invalidate_profile_cache(profile_id)
+        get_search_index().drop_user(profile_id)
+        bump_notes_version(profile_id)
+        return doc is not None
     except Exception as e:
         print(f"Error deleting profile: {e}")
         return False
 
 
 def delete_profile_by_name(name):
+    """Tombstone the named profile; returns its _id (None if not deleted)"""
     if not name or not name.strip():
-        return False
+        return None
 
     profile = get_profile_by_name(name.strip())
-    if profile:
-        return delete_profile(profile["_id"])
-    return False
+    if profile and delete_profile(profile.id):
+        return profile.id
+    return None
@@ -0,0 +1,349 @@
+# ============================================================================
+# FILE: resilience.py
+# ============================================================================
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import os
+import random
+import threading
+import time
+
+
+# ============================================================================
+# ERRORS
+# ============================================================================
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call runs past its per-call timeout or request deadline"""
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a circuit breaker is open and no fallback is available"""
+
+
+# ============================================================================
+# DEADLINES
+# ============================================================================
+
+class Deadline:
+    """Overall time budget for a request, shared by all calls it makes"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, cap: float = None) -> float:
+        """Per-call timeout: what is left of the deadline, capped at `cap`"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return min(remaining, cap) if cap else remaining
+
+
+# Timed-out calls cannot be cancelled, they finish in the background
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RESILIENCE_WORKERS", "16")),
+    thread_name_prefix="resilience"
+)
+
+
+def call_with_timeout(fn, timeout: float):
+    """Run fn() and give up waiting after `timeout` seconds"""
+    future = _executor.submit(fn)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        raise DeadlineExceeded(f"Call timed out after {timeout:.1f}s")
+
+
+# ============================================================================
+# CIRCUIT BREAKERS
+# ============================================================================
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open after a cool-down"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "rejected": 0,
+            "fallbacks": 0,
+            "rate_limited": 0,
+            "opened": 0,
+        }
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go through (one probe at a time when half-open)"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                self._counters["rejected"] += 1
+                return False
+            if state == self.HALF_OPEN:
+                # Re-open immediately; a successful probe closes the breaker
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._counters["calls"] += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            if self._state != self.CLOSED or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._counters["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_rate_limited(self):
+        """A throttled call: the service is up, so it is not a failure"""
+        with self._lock:
+            self._counters["rate_limited"] += 1
+
+    def record_fallback(self):
+        with self._lock:
+            self._counters["fallbacks"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                **self._counters,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get (or create) the process-wide breaker for a dependency"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("BREAKER_RESET_SECONDS", "30")),
+            )
+            _breakers[name] = breaker
+        return breaker
+
+
+def breaker_metrics() -> dict:
+    """Snapshot of every breaker's state and counters, keyed by name"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.metrics() for breaker in breakers}
+
+
+# ============================================================================
+# RATE LIMITING
+# ============================================================================
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether an exception is a provider rate-limit (HTTP 429) response
+
+    Judged by the HTTP status or the SDK's exception type (Groq and OpenAI
+    clients raise RateLimitError), never by the message text.
+    """
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or any(cls.__name__ == "RateLimitError" for cls in type(error).__mro__)
+
+
+class RateLimiter:
+    """Token bucket that backs off when the provider reports rate limiting
+
+    The rate is halved on every rate-limit response (down to `min_rate`)
+    and all callers pause for the cool-down; each success then recovers a
+    twentieth of `max_rate`.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = None, min_rate: float = None):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = min_rate if min_rate is not None else self.max_rate / 16
+        self.rate = self.max_rate
+        self.capacity = burst or max(1, int(requests_per_minute // 6))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"acquired": 0, "waited_seconds": 0.0, "rate_limited": 0}
+
+    def acquire(self, tokens: float = 1, timeout: float = None) -> bool:
+        """Block until `tokens` are available; False if `timeout` runs out first"""
+        if tokens > self.capacity:
+            # The bucket never holds that many; waiting would never end
+            raise ValueError(f"Cannot acquire {tokens} tokens, capacity is {self.capacity}")
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.stats["acquired"] += 1
+                    self.stats["waited_seconds"] += now - started
+                    return True
+                wait_for = max(self._paused_until - now, (tokens - self._tokens) / self.rate)
+            if timeout is not None and now + wait_for - started > timeout:
+                return False
+            time.sleep(min(wait_for, 1.0))
+
+    def on_rate_limited(self, retry_after: float = None):
+        with self._lock:
+            self.stats["rate_limited"] += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+# ============================================================================
+# RETRIES AND HEDGING
+# ============================================================================
+
+def _backoff(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def _hedged(fn, deadline: Deadline, timeout: float, hedge_after: float):
+    """Start a duplicate call if the first is slower than `hedge_after`"""
+    futures = [_executor.submit(fn)]
+    done, _ = wait(futures, timeout=min(hedge_after, deadline.timeout(timeout)))
+    if not done:
+        futures.append(_executor.submit(fn))
+
+    error = None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(
+            pending,
+            timeout=deadline.timeout(timeout),
+            return_when=FIRST_COMPLETED
+        )
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+
+    if error is not None:
+        raise error
+    raise DeadlineExceeded(f"Hedged call timed out after {timeout:.1f}s")
+
+
+def resilient_call(name: str, fn, deadline: Deadline = None, timeout: float = 30.0,
+                   retries: int = 0, hedge_after: float = None, fallback=None,
+                   rate_limit_fallback: bool = True, base_delay: float = 0.2, max_delay: float = 2.0):
+    """Call fn() behind the `name` circuit breaker
+
+    Args:
+        name: Dependency name, one breaker per name (e.g. "groq", "astra")
+        fn: Zero-argument callable doing the actual request
+        deadline: Overall request deadline; per-call timeouts never exceed it
+        timeout: Cap for each individual attempt
+        retries: Extra attempts with jittered backoff (idempotent reads only)
+        hedge_after: Seconds before firing a duplicate request (reads only)
+        fallback: Zero-argument callable used when the call fails or the breaker is open
+        rate_limit_fallback: Whether rate-limit errors use the fallback too; pass
+            False when the caller paces itself and needs to see them
+
+    Rate-limit (429) errors never count as breaker failures, and neither
+    does a deadline that ran out before `name` was called (time spent by
+    earlier steps of the request is not this service's fault).
+    """
+    breaker = get_breaker(name)
+    if deadline is None:
+        deadline = Deadline(timeout * (retries + 1))
+
+    def out_of_time(error):
+        if fallback is not None:
+            print(f"Warning: no time left to call {name}, using fallback")
+            breaker.record_fallback()
+            return fallback()
+        raise error
+
+    # Checked before allow(), so a half-open breaker keeps its probe
+    if deadline.remaining() <= 0:
+        return out_of_time(DeadlineExceeded(f"Request deadline exceeded before calling {name}"))
+
+    if not breaker.allow():
+        if fallback is not None:
+            breaker.record_fallback()
+            return fallback()
+        raise CircuitOpenError(f"{name} is unavailable, please try again shortly")
+
+    attempt = 0
+    while True:
+        called = False
+        try:
+            call_timeout = deadline.timeout(timeout)
+            called = True
+            if hedge_after is not None:
+                result = _hedged(fn, deadline, timeout, hedge_after)
+            else:
+                result = call_with_timeout(fn, call_timeout)
+            breaker.record_success()
+            return result
+        except Exception as e:
+            if not called:
+                return out_of_time(e)  # Ran out during a retry backoff
+            delay = _backoff(attempt, base_delay, max_delay)
+            if attempt < retries and deadline.remaining() > delay:
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            if is_rate_limited(e):
+                breaker.record_rate_limited()
+                if not rate_limit_fallback:
+                    raise
+            else:
+                breaker.record_failure()
+            if fallback is not None:
+                print(f"Warning: {name} call failed, using fallback: {e}")
+                breaker.record_fallback()
+                return fallback()
+            raise
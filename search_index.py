@@ -0,0 +1,290 @@
+# ============================================================================
+# FILE: search_index.py
+# ============================================================================
+
+from collections import defaultdict
+import math
+import re
+import threading
+
+import numpy as np
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about after again all am an and any are as at be been before being but by can
+did do does doing for from had has have having he her here him his how i if in
+into is it its just me more most my no nor not now of off on once only or other
+our out over own same she should so some such than that the their them then there
+these they this to too under until up very was we were what when where which
+while who why will with you your
+""".split())
+
+# Longest suffixes first; (suffix, replacement, minimum stem length)
+_SUFFIXES = (
+    ("ational", "ate", 3), ("ization", "ize", 3), ("fulness", "ful", 3),
+    ("iveness", "ive", 3), ("ements", "", 4), ("ement", "", 4), ("ments", "", 4),
+    ("ment", "", 4), ("ness", "", 3), ("ings", "", 3), ("ing", "", 3),
+    ("ies", "y", 2), ("ied", "y", 2), ("edly", "", 3), ("ed", "", 3),
+    ("ly", "", 3), ("es", "", 4), ("s", "", 3),
+)
+
+
+def stem(token: str) -> str:
+    """Light suffix-stripping stemmer (a small subset of Porter's rules)"""
+    for suffix, replacement, min_stem in _SUFFIXES:
+        if suffix == "s" and token.endswith(("ss", "us", "is")):
+            break  # Not plurals: "press", "hummus", "tennis"
+        if token.endswith(suffix) and len(token) - len(suffix) >= min_stem:
+            token = token[:-len(suffix)] + replacement
+            # "running" -> "runn" -> "run"
+            if suffix in ("ing", "ed") and token[-1] == token[-2] and token[-1] not in "lsz":
+                token = token[:-1]
+            break
+    return token
+
+
+def tokenize(text: str) -> list:
+    """Lowercased, stopword-free, stemmed terms"""
+    return [
+        stem(token)
+        for token in _TOKEN_RE.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60) -> list:
+    """Merge several ranked lists of items into one (RRF)"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+# ============================================================================
+# BM25 INDEX
+# ============================================================================
+
+class UserNoteIndex:
+    """Inverted index over one user's notes, scored with BM25
+
+    Postings are edited as dicts and compiled lazily into numpy arrays, so a
+    query is a handful of vectorized scatter-adds over dense per-note slots.
+    """
+
+    __slots__ = (
+        "postings", "slots", "ids", "texts", "lengths", "free",
+        "total_length", "_compiled", "_length_array"
+    )
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings = defaultdict(dict)  # term -> {slot: term frequency}
+        self.slots = {}                    # note_id -> slot
+        self.ids = []                      # slot -> note_id (None when free)
+        self.texts = {}                    # note_id -> note text
+        self.lengths = []                  # slot -> number of terms
+        self.free = []
+        self.total_length = 0
+        self._compiled = {}                # term -> (slots, tfs) arrays
+        self._length_array = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, note_id, text: str):
+        if note_id in self.slots:
+            self.remove(note_id)
+        if self.free:
+            slot = self.free.pop()
+            self.ids[slot] = note_id
+        else:
+            slot = len(self.ids)
+            self.ids.append(note_id)
+            self.lengths.append(0)
+
+        terms = tokenize(text)
+        for term in terms:
+            postings = self.postings[term]
+            postings[slot] = postings.get(slot, 0) + 1
+            self._compiled.pop(term, None)
+        self.slots[note_id] = slot
+        self.texts[note_id] = text
+        self.lengths[slot] = len(terms)
+        self.total_length += len(terms)
+        self._length_array = None
+
+    def remove(self, note_id):
+        slot = self.slots.pop(note_id, None)
+        if slot is None:
+            return
+        for term in set(tokenize(self.texts.pop(note_id))):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(slot, None)
+                self._compiled.pop(term, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.lengths[slot]
+        self.lengths[slot] = 0
+        self.ids[slot] = None
+        self.free.append(slot)
+        self._length_array = None
+
+    def _term_arrays(self, term):
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self.postings[term]
+            compiled = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+            self._compiled[term] = compiled
+        return compiled
+
+    def search(self, query: str, k: int = 10) -> list:
+        """Top-k [(note_id, score)] for a query"""
+        count = len(self.slots)
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not count or not terms:
+            return []
+
+        if self._length_array is None:
+            self._length_array = np.asarray(self.lengths, dtype=np.float32)
+        avg_length = self.total_length / count or 1.0
+        norm = self.K1 * (1 - self.B + self.B * self._length_array / avg_length)
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in terms:
+            slots, tfs = self._term_arrays(term)
+            df = len(slots)
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            scores[slots] += idf * tfs * (self.K1 + 1) / (tfs + norm[slots])
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(self.ids[slot], float(scores[slot])) for slot in top]
+
+
+class NoteSearchIndex:
+    """Per-user BM25 indexes, built lazily and maintained incrementally
+
+    Each user's index remembers the notes version (profiles.notes_version)
+    it reflects and is rebuilt when the version has moved on, e.g. after
+    another worker process added or deleted notes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}     # user_id -> UserNoteIndex
+        self._versions = {}  # user_id -> notes version the index reflects
+        self._owners = {}    # note_id -> user_id
+
+    @staticmethod
+    def _current_version(user_id) -> int:
+        from profiles import notes_version
+        return notes_version(user_id)
+
+    def _user_index(self, user_id, loader=None, version=None) -> UserNoteIndex:
+        if version is None:
+            # Read before loading, so changes made meanwhile trigger a rebuild
+            version = self._current_version(user_id)
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None and self._versions.get(user_id) == version:
+                return index
+
+        if loader is None:
+            from profiles import get_notes
+            loader = lambda: get_notes(user_id)
+        index = UserNoteIndex()
+        notes = loader()
+        for note in notes:
+            index.add(note.id, note.text)
+
+        with self._lock:
+            # Another thread may have built it meanwhile
+            existing = self._users.get(user_id)
+            if existing is not None and self._versions.get(user_id, -1) >= version:
+                return existing
+            if existing is not None:
+                for note_id in existing.slots:
+                    self._owners.pop(note_id, None)
+            self._users[user_id] = index
+            self._versions[user_id] = version
+            for note in notes:
+                self._owners[note.id] = user_id
+        return index
+
+    def search(self, user_id, query: str, k: int = 10, loader=None) -> list:
+        """Top-k [(note_id, text, score)] among a user's notes
+
+        `loader` returns the user's Notes when the index has to be built;
+        it defaults to reading them from the database.
+        """
+        index = self._user_index(user_id, loader)
+        with self._lock:
+            return [
+                (note_id, index.texts[note_id], score)
+                for note_id, score in index.search(query, k)
+            ]
+
+    def warm(self, user_id, notes, version=None):
+        """Build a user's index from already loaded Notes if not current
+
+        `version` is the notes version read before the notes were loaded.
+        """
+        self._user_index(user_id, lambda: notes, version)
+
+    def advance(self, user_id, version: int):
+        """Record that the index holds the change that bumped the notes to `version`
+
+        Only valid when the index was current just before (version - 1);
+        otherwise it is left stale and rebuilt on next use.
+        """
+        with self._lock:
+            if user_id in self._users and self._versions.get(user_id) == version - 1:
+                self._versions[user_id] = version
+
+    def add(self, user_id, note_id, text: str):
+        """Index a new note (no-op until the user's index has been built)"""
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.add(note_id, text)
+                self._owners[note_id] = user_id
+
+    def remove(self, note_id):
+        with self._lock:
+            user_id = self._owners.pop(note_id, None)
+            index = self._users.get(user_id)
+            if index is not None:
+                index.remove(note_id)
+
+    def drop_user(self, user_id):
+        with self._lock:
+            index = self._users.pop(user_id, None)
+            self._versions.pop(user_id, None)
+            if index is not None:
+                for note_id in index.slots:
+                    self._owners.pop(note_id, None)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> NoteSearchIndex:
+    """The process-wide journal search index"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NoteSearchIndex()
+        return _index
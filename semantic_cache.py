@@ -0,0 +1,208 @@
+# ============================================================================
+# FILE: semantic_cache.py
+# ============================================================================
+
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+import time
+
+import numpy as np
+
+
+EMBEDDING_DIM = 1024
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Words that don't change what a question asks for; everything else
+# (including negations and question words) must match exactly
+_FILLER = frozenset("""
+a an the i me my mine we us our you your it its this that these those is are am
+was were be been being do does did can could would should will shall may might
+please tell just really some any of to for on in at
+""".split())
+
+# Ways of asking that don't change the topic ("any tips for ...")
+_ASKING = frozenset("""
+what how why when where which who tip advice idea suggestion suggest recommend
+recommendation help should do need want know give best good
+""".split())
+
+# Words that point back into the conversation ("what about that one?")
+_REFERRING = frozenset("""
+it its that this those these them they there more again also else instead same
+above previous earlier then
+""".split())
+
+
+# ============================================================================
+# LOCAL EMBEDDING
+# ============================================================================
+
+def _tokens(text: str) -> list:
+    """Lowercase word tokens with a light plural / -ing strip"""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if len(token) > 4 and token.endswith("ing"):
+            token = token[:-3]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _bucket(feature: str) -> tuple:
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % EMBEDDING_DIM, 1.0 if value >> 63 else -1.0
+
+
+def embed(text: str) -> np.ndarray:
+    """Hashed bag of words, word bigrams and character trigrams, L2-normalized"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    tokens = _tokens(text)
+
+    features = [(f"w:{t}", 1.0) for t in tokens]
+    features += [(f"b:{a}_{b}", 0.7) for a, b in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f" {token} "
+        features += [(f"c:{padded[i:i + 3]}", 0.3) for i in range(len(padded) - 2)]
+
+    for feature, weight in features:
+        index, sign = _bucket(feature)
+        vector[index] += sign * weight
+
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def content_terms(text: str) -> tuple:
+    """Sorted distinct non-filler tokens; similar questions must share these"""
+    return tuple(sorted({token for token in _tokens(text) if token not in _FILLER}))
+
+
+def topic_terms(text: str) -> frozenset:
+    """Content words minus the ways of asking: what a question is about"""
+    return frozenset(token for token in content_terms(text) if token not in _ASKING)
+
+
+def is_follow_up(question: str) -> bool:
+    """Whether a question refers back to the conversation"""
+    return any(token in _REFERRING for token in _TOKEN_RE.findall(question.lower()))
+
+
+def conversation_context(question: str, chat_history, turns: int = 2) -> tuple:
+    """The part of the chat an answer depends on, for its cache context
+
+    Standalone questions don't depend on the chat, so they stay reusable
+    turn after turn; follow-ups depend on the last exchange only.
+    """
+    if not is_follow_up(question):
+        return ()
+    return tuple(tuple(turn) for turn in list(chat_history)[-turns:])
+
+
+def fingerprint(*parts) -> int:
+    """Stable 63-bit fingerprint of the context an answer depends on"""
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") >> 1
+
+
+# ============================================================================
+# SEMANTIC ANSWER CACHE
+# ============================================================================
+
+class SemanticCache:
+    """Answer cache matched on question similarity within an identical context
+
+    Entries live in a preallocated matrix so a lookup is one matrix-vector
+    product; slots are reused in LRU order and expire after `ttl` seconds.
+    With `exact_terms` (for answers) a hit also needs the same content
+    words (content_terms), so questions differing only in an antonym or
+    negation ("gain" / "lose") never match however similar their
+    embeddings are. Without it (for retrieved context, where same-topic
+    follow-ups should share results) the score is the better of the
+    embedding similarity and the Dice overlap of the topic_terms, so
+    "any tips for leg day" reuses "what should I do on leg day".
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, threshold: float = 0.9,
+                 exact_terms: bool = True):
+        self.max_entries = max_entries
+        self.exact_terms = exact_terms
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((max_entries, EMBEDDING_DIM), dtype=np.float32)
+        self._contexts = np.full(max_entries, -1, dtype=np.int64)
+        self._terms = np.zeros(max_entries, dtype=np.int64)
+        self._topics = [frozenset()] * max_entries
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._answers = [None] * max_entries
+        self._costs = np.zeros(max_entries, dtype=np.float64)
+        self._lru = OrderedDict()  # slot -> None, least recently used first
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._stats = {"hits": 0, "misses": 0, "seconds_saved": 0.0}
+
+    def lookup(self, question: str, context: int):
+        """Return the cached answer for a similar question, or None"""
+        query = embed(question)
+        terms = fingerprint(content_terms(question))
+        topic = topic_terms(question)
+        with self._lock:
+            now = time.time()
+            live = (self._contexts == context) & (self._expires > now)
+            if self.exact_terms:
+                live &= self._terms == terms
+            if live.any():
+                scores = np.where(live, self._vectors @ query, -1.0)
+                if not self.exact_terms and topic:
+                    for slot in np.flatnonzero(live):
+                        stored = self._topics[slot]
+                        overlap = 2 * len(topic & stored) / (len(topic) + len(stored))
+                        scores[slot] = max(scores[slot], overlap)
+                slot = int(np.argmax(scores))
+                if scores[slot] >= self.threshold:
+                    self._lru.move_to_end(slot)
+                    self._stats["hits"] += 1
+                    self._stats["seconds_saved"] += float(self._costs[slot])
+                    return self._answers[slot]
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, question: str, context: int, answer, cost: float = 0.0):
+        """Cache an answer; `cost` is the seconds it took, reported as saved on hits"""
+        vector = embed(question)
+        terms = fingerprint(content_terms(question))
+        topic = topic_terms(question)
+        with self._lock:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot, _ = self._lru.popitem(last=False)
+            self._vectors[slot] = vector
+            self._contexts[slot] = context
+            self._terms[slot] = terms
+            self._topics[slot] = topic
+            self._expires[slot] = time.time() + self.ttl
+            self._answers[slot] = answer
+            self._costs[slot] = cost
+            self._lru[slot] = None
+
+    def clear(self):
+        with self._lock:
+            self._contexts[:] = -1
+            self._answers = [None] * self.max_entries
+            self._lru.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._lru),
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
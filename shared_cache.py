@@ -0,0 +1,285 @@
+# ============================================================================
+# FILE: shared_cache.py
+# ============================================================================
+
+from collections import OrderedDict
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+
+# All worker processes on a host must point at the same file
+CACHE_PATH = os.getenv("SHARED_CACHE_PATH", ".shared_cache.sqlite")
+MEMORY_ENTRIES = int(os.getenv("SHARED_CACHE_ENTRIES", "2000"))
+DEFAULT_TTL = float(os.getenv("SHARED_CACHE_TTL_SECONDS", "3600"))
+# How often a process checks for invalidations sent by other processes
+POLL_INTERVAL = float(os.getenv("SHARED_CACHE_POLL_SECONDS", "0.25"))
+# Invalidation messages older than this are pruned
+MESSAGE_RETENTION = 600.0
+PRUNE_EVERY = 200  # puts
+
+
+class SharedCache:
+    """Cache shared by all worker processes on a host (SQLite WAL)
+
+    Values are pickled into one table that every process reads and writes;
+    each process also keeps a small in-memory tier in front of it. Writes
+    append invalidation messages (exact keys or key prefixes) to a second
+    table, which every process polls to drop stale entries from its memory
+    tier. Loads that race with an invalidation are not stored.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, memory_entries: int = MEMORY_ENTRIES,
+                 poll_interval: float = POLL_INTERVAL):
+        self.memory_entries = memory_entries
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (pickled value, expires)
+        self._versions = {}           # version counters when there is no file
+        self._db = None
+        self._seen = 0                # last invalidation message applied
+        self._polled = 0.0
+        self._puts = 0
+        if path:
+            self._db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS invalidations "
+                "(seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, "
+                "prefix INTEGER NOT NULL, created REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS versions "
+                "(key TEXT PRIMARY KEY, version INTEGER NOT NULL);"
+            )
+            self._db.commit()
+            self._seen = self._latest_seq()
+        self._stats = {
+            "memory_hits": 0, "shared_hits": 0, "misses": 0, "stored": 0,
+            "stale_skipped": 0, "invalidations_sent": 0, "invalidations_received": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Reads and writes
+    # ------------------------------------------------------------------
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            self._poll()
+            now = time.time()
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return pickle.loads(entry[0])
+
+            row = None
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires FROM entries WHERE key = ? AND expires > ?",
+                    (key, now)
+                ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return default
+            self._remember(key, row[0], row[1])
+            self._stats["shared_hits"] += 1
+            return pickle.loads(row[0])
+
+    def get_or_load(self, key: str, loader, ttl: float = DEFAULT_TTL):
+        """Return the cached value, or call loader() and cache its result
+
+        None results are not cached.
+        """
+        _missing = object()
+        value = self.get(key, _missing)
+        if value is not _missing:
+            return value
+
+        since = self.sequence()
+        value = loader()
+        if value is not None:
+            self.put(key, value, ttl, since=since)
+        return value
+
+    def sequence(self) -> int:
+        """Latest invalidation sequence, to pass as put(since=...) after a load"""
+        with self._lock:
+            return self._latest_seq()
+
+    def put(self, key: str, value, ttl: float = DEFAULT_TTL, since: int = None):
+        """Store a value for every process
+
+        `since` is the invalidation sequence observed before the value was
+        loaded; the put is skipped if the key was invalidated after it.
+        """
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        expires = time.time() + ttl
+        with self._lock:
+            if self._db is not None:
+                with self._db:
+                    if since is not None and self._invalidated_since(key, since):
+                        self._stats["stale_skipped"] += 1
+                        return
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)",
+                        (key, blob, expires)
+                    )
+                self._puts += 1
+                if self._puts % PRUNE_EVERY == 0:
+                    self._prune()
+            self._remember(key, blob, expires)
+            self._stats["stored"] += 1
+
+    def invalidate(self, *keys: str):
+        """Drop exact keys here and in every other process"""
+        self._send(keys, prefix=False)
+
+    def invalidate_prefix(self, *prefixes: str):
+        """Drop every key starting with one of the prefixes, in every process"""
+        self._send(prefixes, prefix=True)
+
+    def _send(self, keys, prefix: bool):
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._forget(key, prefix)
+            if self._db is not None:
+                now = time.time()
+                with self._db:
+                    for key in keys:
+                        if prefix:
+                            self._db.execute(
+                                "DELETE FROM entries WHERE substr(key, 1, ?) = ?",
+                                (len(key), key)
+                            )
+                        else:
+                            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._db.executemany(
+                        "INSERT INTO invalidations (key, prefix, created) VALUES (?, ?, ?)",
+                        [(key, int(prefix), now) for key in keys]
+                    )
+            self._stats["invalidations_sent"] += len(keys)
+
+    # ------------------------------------------------------------------
+    # Version counters
+    # ------------------------------------------------------------------
+
+    def version(self, key: str) -> int:
+        """Host-wide version counter (0 until first bumped)"""
+        if self._db is None:
+            return self._versions.get(key, 0)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version FROM versions WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, key: str) -> int:
+        """Increment a version counter for every process"""
+        if self._db is None:
+            with self._lock:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                return self._versions[key]
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO versions (key, version) VALUES (?, 1) "
+                "ON CONFLICT(key) DO UPDATE SET version = version + 1",
+                (key,)
+            )
+            return self._db.execute(
+                "SELECT version FROM versions WHERE key = ?", (key,)
+            ).fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Internals (lock held)
+    # ------------------------------------------------------------------
+
+    def _remember(self, key, blob, expires):
+        self._memory[key] = (blob, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _forget(self, key, prefix):
+        if prefix:
+            for cached in [k for k in self._memory if k.startswith(key)]:
+                del self._memory[cached]
+        else:
+            self._memory.pop(key, None)
+
+    def _latest_seq(self) -> int:
+        if self._db is None:
+            return 0
+        row = self._db.execute("SELECT MAX(seq) FROM invalidations").fetchone()
+        return row[0] or 0
+
+    def _invalidated_since(self, key, since) -> bool:
+        row = self._db.execute(
+            "SELECT 1 FROM invalidations WHERE seq > ? AND "
+            "(key = ? OR (prefix = 1 AND substr(?, 1, length(key)) = key)) LIMIT 1",
+            (since, key, key)
+        ).fetchone()
+        return row is not None
+
+    def _poll(self):
+        """Apply invalidation messages sent by other processes"""
+        if self._db is None:
+            return
+        now = time.monotonic()
+        if now - self._polled < self.poll_interval:
+            return
+        self._polled = now
+
+        rows = self._db.execute(
+            "SELECT seq, key, prefix FROM invalidations WHERE seq > ? ORDER BY seq",
+            (self._seen,)
+        ).fetchall()
+        if rows and rows[0][0] > self._seen + 1 and self._seen:
+            # Messages we never saw were pruned; nothing in memory can be trusted
+            self._memory.clear()
+        for seq, key, prefix in rows:
+            self._forget(key, prefix)
+            self._seen = seq
+        self._stats["invalidations_received"] += len(rows)
+
+    def _prune(self):
+        with self._db:
+            self._db.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+            # Keep the newest message so the sequence never restarts
+            self._db.execute(
+                "DELETE FROM invalidations WHERE created < ? AND "
+                "seq < (SELECT MAX(seq) FROM invalidations)",
+                (time.time() - MESSAGE_RETENTION,)
+            )
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["shared_hits"] + self._stats["misses"]
+            hits = lookups - self._stats["misses"]
+            return {
+                **self._stats,
+                "memory_entries": len(self._memory),
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """The process's handle on the host-wide shared cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SharedCache()
+        return _cache
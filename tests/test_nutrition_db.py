@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nutrition_db import get_nutrition_db, lookup_foods  # noqa: E402
+
+
+def test_plural_finds_singular_name():
+    db = get_nutrition_db()
+    index, _ = db.search("eggs")[0]
+    assert db.names[index] == "Egg (whole)"
+
+
+def test_plural_with_count():
+    result = lookup_foods("2 eggs")
+    assert result.startswith("Egg (whole), per 100 g:")
+    assert "quantity '2' not converted" in result
+
+
+def test_and_inside_food_name_is_not_split():
+    result = lookup_foods("mac and cheese")
+    assert result.startswith("Macaroni and cheese, 100 g:")
+    assert "\n" not in result
+
+
+def test_household_measure_is_reported_not_defaulted():
+    result = lookup_foods("peanut butter 2 tbsp")
+    assert result.startswith("Peanut butter, per 100 g:")
+    assert "quantity '2 tbsp' not converted" in result
+    assert "100 g:" not in result.replace("per 100 g:", "")
+
+
+def test_weights_are_scaled_and_totalled():
+    result = lookup_foods("200g chicken breast, 2 eggs + 150 g white rice").split("\n")
+    assert result[0].startswith("Chicken breast (cooked), 200 g: 330 kcal")
+    assert result[1].startswith("Egg (whole), per 100 g:")
+    assert result[2].startswith("White rice (cooked), 150 g:")
+    assert result[3].startswith("Total of weighed items:")
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilience import (  # noqa: E402
+    CircuitOpenError, Deadline, DeadlineExceeded, RateLimiter, get_breaker, resilient_call
+)
+
+
+def test_burst_then_waits_for_refill():
+    limiter = RateLimiter(600, burst=2)  # 10 tokens per second
+    assert limiter.acquire(timeout=0)
+    assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.01)
+    started = time.monotonic()
+    assert limiter.acquire(timeout=1)
+    assert 0.02 < time.monotonic() - started < 0.5
+
+
+def test_request_larger_than_capacity_raises():
+    limiter = RateLimiter(10)  # capacity 1
+    with pytest.raises(ValueError):
+        limiter.acquire(2, timeout=5)
+
+
+def test_low_rate_with_burst_holds_a_multi_token_request():
+    limiter = RateLimiter(10, burst=2)
+    assert limiter.acquire(2, timeout=0)
+
+
+def test_rate_limited_halves_rate_and_pauses():
+    limiter = RateLimiter(600, burst=5)
+    limiter.on_rate_limited(retry_after=0.2)
+    assert limiter.rate == pytest.approx(5.0)
+    assert not limiter.acquire(timeout=0.05)
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(5.5)
+
+
+def test_spent_deadline_is_not_a_breaker_failure():
+    calls = []
+    deadline = Deadline(0)
+    for _ in range(10):
+        with pytest.raises(DeadlineExceeded):
+            resilient_call("spent-deadline", lambda: calls.append(1), deadline=deadline)
+    assert resilient_call("spent-deadline", lambda: 1, deadline=deadline, fallback=lambda: "fallback") == "fallback"
+    assert calls == []
+    metrics = get_breaker("spent-deadline").metrics()
+    assert metrics["state"] == "closed"
+    assert metrics["failures"] == 0
+    assert resilient_call("spent-deadline", lambda: "ok") == "ok"
+
+
+def test_failures_open_the_breaker():
+    def fail():
+        raise ConnectionError("down")
+
+    for _ in range(5):
+        with pytest.raises(ConnectionError):
+            resilient_call("failing-service", fail)
+    with pytest.raises(CircuitOpenError):
+        resilient_call("failing-service", lambda: "ok")
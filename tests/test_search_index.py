@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import UserNoteIndex, reciprocal_rank_fusion, stem, tokenize  # noqa: E402
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("press", "press"),
+    ("pressed", "press"),
+    ("pressing", "press"),
+    ("presses", "press"),
+    ("running", "run"),
+    ("squats", "squat"),
+    ("berries", "berry"),
+    ("fitness", "fit"),
+    ("hummus", "hummus"),
+    ("tennis", "tennis"),
+    ("eggs", "egg"),
+])
+def test_stem(word, expected):
+    assert stem(word) == expected
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("I was pressing the bar") == ["press", "bar"]
+
+
+def _index(notes):
+    index = UserNoteIndex()
+    for note_id, text in notes.items():
+        index.add(note_id, text)
+    return index
+
+
+def test_search_matches_inflected_forms():
+    index = _index({1: "Bench pressed 100kg", 2: "Leg day: squats and lunges"})
+    assert [note_id for note_id, _ in index.search("press")] == [1]
+    assert [note_id for note_id, _ in index.search("squatting")] == [2]
+
+
+def test_rarer_terms_rank_higher():
+    index = _index({
+        1: "squats squats and deadlifts",
+        2: "squats today",
+        3: "squats again",
+        4: "rest day",
+    })
+    assert index.search("deadlifts squats")[0][0] == 1
+    assert {note_id for note_id, _ in index.search("squats")} == {1, 2, 3}
+
+
+def test_removed_notes_are_not_found():
+    index = _index({1: "Bench pressed 100kg", 2: "Overhead press 40kg"})
+    index.remove(1)
+    assert [note_id for note_id, _ in index.search("press")] == [2]
+
+
+def test_reciprocal_rank_fusion_prefers_items_ranked_by_both():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])[0] == "b"
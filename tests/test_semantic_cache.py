@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache, conversation_context, fingerprint  # noqa: E402
+
+
+CONTEXT = 42
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("How can I build muscle and lose fat?", "How can I build muscle and gain fat?"),
+    ("What should I eat to lose weight?", "What should I eat to gain weight?"),
+    ("Should I eat carbs before my workout?", "Should I not eat carbs before my workout?"),
+    ("Is it ok to eat eggs every day?", "Is it ok to eat no eggs every day?"),
+    ("How much protein should I eat on rest days?", "How much protein should I eat on training days?"),
+])
+def test_antonyms_and_negations_miss(stored, asked):
+    cache = SemanticCache(max_entries=8)
+    cache.store(stored, CONTEXT, "cached answer")
+    assert cache.lookup(asked, CONTEXT) is None
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("What should I eat to lose weight?", "what should i eat to lose weight"),
+    ("How much protein do I need per day?", "How much protein do I need per day please"),
+])
+def test_rephrasings_hit(stored, asked):
+    cache = SemanticCache(max_entries=8)
+    cache.store(stored, CONTEXT, "cached answer")
+    assert cache.lookup(asked, CONTEXT) == "cached answer"
+
+
+def test_context_must_match():
+    cache = SemanticCache(max_entries=8)
+    cache.store("How much protein should I eat per day?", CONTEXT, "cached answer")
+    assert cache.lookup("How much protein should I eat per day?", CONTEXT + 1) is None
+
+
+def _answer_context(question, chat_history):
+    # As AskAISystem._ask: profile, notes and intake stand in as one part
+    return fingerprint("profile, notes and intake", conversation_context(question, chat_history))
+
+
+def test_repeated_standalone_question_hits_on_a_later_turn():
+    cache = SemanticCache(max_entries=8)
+    question = "How much protein should I eat per day?"
+    first_turn = [("human", "Hi coach"), ("ai", "Hi! How can I help?")]
+    cache.store(question, _answer_context(question, first_turn), "cached answer")
+
+    later_turn = first_turn + [("human", "Plan my leg day"), ("ai", "Squats, lunges...")]
+    assert cache.lookup(question, _answer_context(question, later_turn)) == "cached answer"
+
+
+def test_follow_up_question_depends_on_the_last_exchange():
+    question = "How many calories does that burn?"
+    squats = [("human", "Plan my leg day"), ("ai", "Squats, lunges...")]
+    running = [("human", "Plan a cardio session"), ("ai", "Run 5 km...")]
+    assert _answer_context(question, squats) != _answer_context(question, running)
+    assert _answer_context(question, [("human", "Hi")] + squats) == _answer_context(question, squats)
+
+
+@pytest.mark.parametrize("asked", ["any tips for leg day", "what exercises on leg day"])
+def test_retrieval_cache_reuses_same_topic_follow_ups(asked):
+    cache = SemanticCache(max_entries=8, threshold=0.8, exact_terms=False)
+    cache.store("what should I do on leg day", CONTEXT, "leg day notes")
+    assert cache.lookup(asked, CONTEXT) == "leg day notes"
+
+
+@pytest.mark.parametrize("asked", ["what should I eat on rest day", "how do I lose weight"])
+def test_retrieval_cache_misses_other_topics(asked):
+    cache = SemanticCache(max_entries=8, threshold=0.8, exact_terms=False)
+    cache.store("what should I do on leg day", CONTEXT, "leg day notes")
+    assert cache.lookup(asked, CONTEXT) is None
@@ -0,0 +1,124 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("astrapy")  # write_behind imports db
+
+import write_behind  # noqa: E402
+from shared_cache import SharedCache  # noqa: E402
+
+
+class _Result:
+    def __init__(self, matched):
+        self.update_info = {"n": matched}
+
+
+class _Collection:
+    """Just enough of update_one for write_behind's conditional $set"""
+
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: doc for doc in docs}
+
+    @staticmethod
+    def _get(doc, path):
+        for part in path.split("."):
+            if not isinstance(doc, dict) or part not in doc:
+                return None, False
+            doc = doc[part]
+        return doc, True
+
+    def _matches(self, doc, condition):
+        for key, value in condition.items():
+            if key == "$and":
+                if not all(self._matches(doc, c) for c in value):
+                    return False
+            elif key == "$or":
+                if not any(self._matches(doc, c) for c in value):
+                    return False
+            else:
+                found, exists = self._get(doc, key)
+                if "$exists" in value and value["$exists"] != exists:
+                    return False
+                if "$lte" in value and not (exists and found <= value["$lte"]):
+                    return False
+        return True
+
+    def update_one(self, query, update):
+        doc = self.docs.get(query["_id"])
+        if doc is None or not self._matches(doc, {k: v for k, v in query.items() if k != "_id"}):
+            return _Result(0)
+        for path, value in update["$set"].items():
+            target = doc
+            *parents, last = path.split(".")
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[last] = value
+        return _Result(1)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = _Collection([{"_id": 1, "general": {"name": "Old"}, "goals": []}])
+    monkeypatch.setattr(write_behind, "get_collection", lambda name: collection)
+    monkeypatch.setattr(write_behind, "get_shared_cache", lambda: SharedCache(path=""))
+    return collection
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def _crashed_log(base, entries):
+    """A log left by a process that died before flushing"""
+    with open(f"{base}.{_dead_pid()}", "w", encoding="utf-8") as log:
+        for fields, stamp in entries:
+            log.write(json.dumps({"c": "personal_data", "id": 1, "set": fields, "ts": stamp}) + "\n")
+
+
+def test_replay_after_crash_does_not_overwrite_newer_edit(tmp_path, collection):
+    base = str(tmp_path / "wb.log")
+    _crashed_log(base, [({"general": {"name": "Crashed"}, "goals": ["Fat Loss"]}, 100.0)])
+    # A live worker saved a newer name meanwhile
+    collection.docs[1]["general"] = {"name": "Newer"}
+    collection.docs[1]["updated_at"] = {"general": 200.0}
+
+    buffer = write_behind.WriteBehindBuffer(interval=3600, log_path=base)
+    buffer.close()
+
+    doc = collection.docs[1]
+    assert doc["general"] == {"name": "Newer"}
+    assert doc["goals"] == ["Fat Loss"]  # Not edited since: replayed
+    assert doc["updated_at"] == {"general": 200.0, "goals": 100.0}
+    assert buffer.metrics()["replayed"] == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_orphaned_logs_are_claimed_after_start(tmp_path, collection):
+    base = str(tmp_path / "wb.log")
+    buffer = write_behind.WriteBehindBuffer(interval=3600, log_path=base)
+    _crashed_log(base, [({"goals": ["Muscle Gain"]}, 100.0)])
+
+    buffer._claim_orphans()
+    buffer.flush()
+    buffer.close()
+
+    assert collection.docs[1]["goals"] == ["Muscle Gain"]
+
+
+def test_older_write_never_replaces_newer_pending_one(tmp_path, collection):
+    base = str(tmp_path / "wb.log")
+    buffer = write_behind.WriteBehindBuffer(interval=3600, log_path=base)
+    buffer.enqueue("personal_data", 1, {"general": {"name": "Live"}})
+    _crashed_log(base, [({"general": {"name": "Crashed"}}, 100.0)])
+
+    buffer._claim_orphans()
+    buffer.close()
+
+    assert collection.docs[1]["general"] == {"name": "Live"}
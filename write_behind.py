@@ -0,0 +1,371 @@
+# ============================================================================
+# FILE: write_behind.py
+# ============================================================================
+
+from db import get_collection
+from shared_cache import get_shared_cache
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND", "0") == "1"
+FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "2"))
+MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "500"))
+# How often the flusher looks for logs left behind by dead processes
+CLAIM_INTERVAL = float(os.getenv("WRITE_BEHIND_CLAIM_INTERVAL", "30"))
+# Per-field write times kept on each document ("updated_at.<field>")
+STAMP_FIELD = "updated_at"
+# Base path of the replay logs; each process writes "<base>.<pid>" and
+# replays the logs of processes that are no longer running
+LOG_PATH = os.getenv("WRITE_BEHIND_LOG", ".write_behind.log")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+    return True
+
+
+class WriteBehindBuffer:
+    """Coalesces `$set` mutations per document and flushes them in batches
+
+    Every mutation is appended to a per-process replay log, with its time,
+    before it is acknowledged. On start and then every `claim_interval`
+    seconds, a process claims the logs of dead processes (renaming them, so
+    only one process replays each) and re-queues their unflushed writes.
+    Each field is written with its edit time and only over an older one, so
+    a late replay never overwrites an edit made since. Pending documents
+    above `max_pending` force a synchronous flush (back-pressure) instead of
+    growing without bound.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING,
+                 log_path: str = LOG_PATH, claim_interval: float = CLAIM_INTERVAL):
+        self.interval = interval
+        self.claim_interval = claim_interval
+        self.max_pending = max_pending
+        self.log_base = log_path
+        self.log_path = f"{log_path}.{os.getpid()}" if log_path else None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # (collection, _id) -> merged $set fields
+        self._stamps = {}   # (collection, _id) -> {field: time of its latest edit}
+        self._since = {}    # (collection, _id) -> time of oldest unflushed write
+        self._inflight = {}  # batch currently being written by flush()
+        self._log = open(self.log_path, "a", encoding="utf-8") if self.log_path else None
+        self._stop = threading.Event()
+        self._metrics = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "flushed_docs": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "backpressure_flushes": 0,
+            "replayed": 0,
+            "superseded": 0,
+            "last_flush_seconds": 0.0,
+        }
+
+        self._replay()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ------------------------------------------------------------------
+    # Mutations
+    # ------------------------------------------------------------------
+
+    def enqueue(self, collection: str, _id, fields: dict):
+        """Record a `$set` for one document; it is written on the next flush"""
+        stamp = time.time()
+        with self._lock:
+            self._append_log(collection, _id, fields, stamp)
+            self._merge(collection, _id, fields, stamp)
+            self._metrics["enqueued"] += 1
+            over_limit = len(self._pending) >= self.max_pending
+
+        if over_limit:
+            self._metrics["backpressure_flushes"] += 1
+            self.flush()
+
+    def _merge(self, collection, _id, fields, stamp):
+        """Merge a write into the pending ones; older field values never win"""
+        key = (collection, _id)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = {}
+            self._stamps[key] = {}
+            self._since[key] = time.time()
+        else:
+            self._metrics["coalesced"] += 1
+        stamps = self._stamps[key]
+        for field, value in fields.items():
+            if stamp >= stamps.get(field, 0.0):
+                pending[field] = value
+                stamps[field] = stamp
+
+    def overlay(self, collection: str, doc: dict) -> dict:
+        """Apply unflushed writes to a document read from the database"""
+        if doc is None:
+            return doc
+        key = (collection, doc.get("_id"))
+        with self._lock:
+            doc.update(self._inflight.get(key, {}))
+            doc.update(self._pending.get(key, {}))
+        return doc
+
+    def discard(self, collection: str, _id):
+        """Drop unflushed writes for a document (e.g. one being deleted)"""
+        with self._lock:
+            self._pending.pop((collection, _id), None)
+            self._stamps.pop((collection, _id), None)
+            self._since.pop((collection, _id), None)
+            self._rewrite_log()
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+
+    def flush(self):
+        """Write all pending documents, one merged `update_one` each"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                stamps, self._stamps = self._stamps, {}
+                since, self._since = self._since, {}
+                self._inflight = batch
+            if not batch:
+                return
+
+            started = time.monotonic()
+            failed = {}
+            written = set()
+            for (collection, _id), fields in batch.items():
+                try:
+                    if self._write(collection, _id, fields, stamps[(collection, _id)]):
+                        written.add((collection, _id))
+                        self._metrics["flushed_docs"] += 1
+                except Exception as e:
+                    print(f"Error flushing write-behind update for {collection}/{_id}: {e}")
+                    failed[(collection, _id)] = fields
+
+            # Other worker processes re-read the flushed documents (and any
+            # lookups derived from their collection) from the database
+            if written:
+                cache = get_shared_cache()
+                cache.invalidate(*{f"{collection}:{_id}" for collection, _id in written})
+                cache.invalidate_prefix(*{f"{collection}:index:" for collection, _ in written})
+                # Version keys of main.py's loaders, bumped only now that the
+                # database has the edit (a bump at enqueue time let another
+                # worker cache the old profile under the new version)
+                for collection, _id in written:
+                    if collection == "personal_data":
+                        cache.bump(f"profile:{_id}")
+                if any(collection == "personal_data" and "general" in batch[(collection, _id)]
+                       for collection, _id in written):
+                    cache.bump("names")
+
+            with self._lock:
+                # Failed writes go back under any newer ones for the same document
+                for key, fields in failed.items():
+                    newer, newer_stamps = self._pending.get(key, {}), self._stamps.get(key, {})
+                    self._pending[key] = {**fields, **newer}
+                    self._stamps[key] = {**stamps[key], **newer_stamps}
+                    self._since[key] = min(since[key], self._since.get(key, since[key]))
+                self._inflight = {}
+                self._metrics["flushes"] += 1
+                self._metrics["flush_failures"] += len(failed)
+                self._metrics["last_flush_seconds"] = time.monotonic() - started
+                self._rewrite_log()
+
+    def _write(self, collection, _id, fields, stamps) -> bool:
+        """Set each field only where the document's copy is older
+
+        One update when no field was edited since; otherwise field by
+        field, skipping the superseded ones. Returns whether anything
+        was written.
+        """
+        def newer_than(field):
+            return {"$or": [
+                {f"{STAMP_FIELD}.{field}": {"$exists": False}},
+                {f"{STAMP_FIELD}.{field}": {"$lte": stamps[field]}},
+            ]}
+
+        def update(names):
+            result = get_collection(collection).update_one(
+                {"_id": _id, "$and": [newer_than(field) for field in names]},
+                {"$set": {
+                    **{field: fields[field] for field in names},
+                    **{f"{STAMP_FIELD}.{field}": stamps[field] for field in names},
+                }}
+            )
+            return bool(result.update_info.get("n"))
+
+        if update(list(fields)):
+            return True
+        written = False
+        if len(fields) > 1:
+            for field in fields:
+                written = update([field]) or written
+        if not written:
+            self._metrics["superseded"] += 1
+        return written
+
+    def _run(self):
+        claimed = time.monotonic()
+        while not self._stop.wait(self.interval):
+            try:
+                if time.monotonic() - claimed >= self.claim_interval:
+                    claimed = time.monotonic()
+                    self._claim_orphans()
+                self.flush()
+            except Exception as e:
+                print(f"Error in write-behind flush: {e}")
+
+    def close(self):
+        """Stop the flusher and write everything still pending"""
+        self._stop.set()
+        self.flush()
+        if self._log:
+            self._log.close()
+            self._log = None
+            with self._lock:
+                if not self._pending and os.path.exists(self.log_path):
+                    os.remove(self.log_path)
+
+    # ------------------------------------------------------------------
+    # Replay log
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _log_line(collection, _id, fields, stamp) -> str:
+        return json.dumps({"c": collection, "id": _id, "set": fields, "ts": stamp}, default=str) + "\n"
+
+    def _append_log(self, collection, _id, fields, stamp):
+        if self._log:
+            self._log.write(self._log_line(collection, _id, fields, stamp))
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+    def _rewrite_log(self):
+        """Compact the log down to what is still pending (lock held)"""
+        if not self.log_path or self._log is None:
+            return
+        tmp_path = f"{self.log_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as tmp:
+            for (collection, _id), fields in self._pending.items():
+                # One line per distinct edit time, so replays keep the field times
+                by_stamp = {}
+                for field, value in fields.items():
+                    stamp = self._stamps[(collection, _id)][field]
+                    by_stamp.setdefault(stamp, {})[field] = value
+                for stamp, group in by_stamp.items():
+                    tmp.write(self._log_line(collection, _id, group, stamp))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        self._log.close()
+        os.replace(tmp_path, self.log_path)
+        self._log = open(self.log_path, "a", encoding="utf-8")
+
+    def _orphaned_logs(self) -> list:
+        """Logs left by processes that are no longer running
+
+        That is "<base>.<pid>" and "<base>.<pid>.claimed-<n>" for dead pids
+        (or our own pid, reused from a dead process), plus a "<base>" shared
+        log written by older versions.
+        """
+        paths = [self.log_base] if os.path.exists(self.log_base) else []
+        for path in glob.glob(f"{glob.escape(self.log_base)}.*"):
+            owner, _, rest = path[len(self.log_base) + 1:].partition(".")
+            if not owner.isdigit() or (rest and not rest.startswith("claimed-")):
+                continue  # Compaction temp files
+            if int(owner) == os.getpid() or not _pid_alive(int(owner)):
+                paths.append(path)
+        return sorted(paths)
+
+    def _read_log(self, path):
+        """Merge a log's writes into the pending ones (lock held)"""
+        with open(path, encoding="utf-8") as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn final line from a crash mid-write
+                # Entries from before edit times were logged lose to any stamped edit
+                self._merge(entry["c"], entry["id"], entry["set"], entry.get("ts", 0.0))
+                self._metrics["replayed"] += 1
+
+    def _replay(self):
+        """Re-queue writes a dead process with our pid logged, then claim the rest"""
+        if not self.log_path:
+            return
+        with self._lock:
+            if os.path.exists(self.log_path):
+                self._read_log(self.log_path)
+        self._claim_orphans()
+
+    def _claim_orphans(self):
+        """Take over the logs of dead processes and re-queue their writes"""
+        if not self.log_path:
+            return
+        claimed = []
+        for n, path in enumerate(self._orphaned_logs()):
+            if path == self.log_path:
+                continue  # Our own log, read by _replay
+            if path.startswith(f"{self.log_path}.claimed-"):
+                claimed.append(path)  # Claimed by a dead process with our pid
+                continue
+            claim = f"{self.log_path}.claimed-{time.time_ns()}-{n}"
+            try:
+                os.rename(path, claim)
+            except FileNotFoundError:
+                continue  # Another process claimed it first
+            claimed.append(claim)
+        if not claimed:
+            return
+
+        with self._lock:
+            for path in claimed:
+                self._read_log(path)
+            # Our own log now holds the claimed writes; then drop the claims
+            self._rewrite_log()
+        for path in claimed:
+            os.remove(path)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def metrics(self) -> dict:
+        with self._lock:
+            oldest = min(self._since.values()) if self._since else None
+            return {
+                **self._metrics,
+                "pending_docs": len(self._pending),
+                "pending_fields": sum(len(fields) for fields in self._pending.values()),
+                "oldest_pending_seconds": time.time() - oldest if oldest else 0.0,
+                "max_pending": self.max_pending,
+            }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_behind():
+    """The process-wide write-behind buffer, or None when WRITE_BEHIND is off"""
+    global _buffer
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer()
+        return _buffer